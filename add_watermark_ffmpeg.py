@@ -1,580 +1,1787 @@
-import os
-import subprocess
-import sys
-import traceback
-import json
-
-# 平台列表
-PLATFORMS = {
-    "douyin": "抖音精选",
-    "kuaishou": "快手精选",
-    "baijiahao": "百家号精选",
-    "weibo": "微博",
-    "meitan": "美团精选",
-    "duoduo": "多多精选",
-    "zfb": "支付宝精选",
-    "weishi": "腾讯微视精选",
-    "toutiao": "头条精选",
-    "ppx": "皮皮虾精选",
-    "aiqiyi": "爱奇艺精选",
-    "xiaohongshu": "小红书精选",
-    "wechat": "视频号精选",
-    "douyin2": "抖音瞎选",
-    "dewu": "得物精选"
-}
-
-def load_config():
-    """加载配置文件"""
-    config_path = "watermark_config.json"
-    default_config = {
-        "global": {
-            "position_mode": "coordinates",
-            "size": {
-                "scale": 0.10
-            }
-        },
-        "platforms": {}
-    }
-    
-    # 为所有平台创建默认配置
-    for platform in PLATFORMS.keys():
-        default_config["platforms"][platform] = {
-            "position_mode": "coordinates",
-            "coordinates": {
-                "x": 100,
-                "y": 200
-            },
-            "margins": {
-                "right_margin": 50,
-                "bottom_margin": 50
-            }
-        }
-    
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            
-            # 如果配置文件是旧格式，转换为新格式
-            if "position_mode" in config and "platforms" not in config:
-                print("检测到旧版配置文件，正在转换为新格式...")
-                new_config = default_config.copy()
-                new_config["global"] = {
-                    "position_mode": config.get("position_mode", "coordinates"),
-                    "size": config.get("size", {"scale": 0.10})
-                }
-                
-                # 为所有平台设置相同的配置
-                for platform in PLATFORMS.keys():
-                    new_config["platforms"][platform] = {
-                        "position_mode": config.get("position_mode", "coordinates"),
-                        "coordinates": config.get("coordinates", {"x": 100, "y": 200}),
-                        "margins": config.get("margins", {"right_margin": 50, "bottom_margin": 50})
-                    }
-                
-                # 保存新格式的配置
-                with open(config_path, 'w', encoding='utf-8') as f_out:
-                    json.dump(new_config, f_out, indent=4, ensure_ascii=False)
-                
-                return new_config
-                
-            return config
-    except:
-        print("配置文件不存在或格式错误，使用默认配置")
-        return default_config
-
-def get_video_info(video_path):
-    """获取视频信息的更健壮方法"""
-    try:
-        # 分别获取视频信息
-        cmd_width_height = [
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height', '-of', 'csv=p=0', video_path
-        ]
-        
-        cmd_bitrate = [
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=bit_rate', '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-        ]
-        
-        cmd_codec = [
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=codec_name', '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-        ]
-        
-        cmd_pix_fmt = [
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=pix_fmt', '-of', 'default=noprint_wrappers=1:nokey=1', video_path
-        ]
-        
-        # 执行命令
-        result_wh = subprocess.run(cmd_width_height, capture_output=True, text=True, timeout=10)
-        result_br = subprocess.run(cmd_bitrate, capture_output=True, text=True, timeout=10)
-        result_codec = subprocess.run(cmd_codec, capture_output=True, text=True, timeout=10)
-        result_pix = subprocess.run(cmd_pix_fmt, capture_output=True, text=True, timeout=10)
-        
-        # 解析结果
-        width, height = 0, 0
-        if result_wh.returncode == 0 and result_wh.stdout.strip():
-            wh_parts = result_wh.stdout.strip().split(',')
-            if len(wh_parts) >= 2:
-                width, height = int(wh_parts[0]), int(wh_parts[1])
-        
-        bitrate = None
-        if result_br.returncode == 0 and result_br.stdout.strip():
-            bitrate = int(result_br.stdout.strip())
-        
-        codec = 'h264'
-        if result_codec.returncode == 0 and result_codec.stdout.strip():
-            codec = result_codec.stdout.strip()
-        
-        pix_fmt = 'yuv420p'
-        if result_pix.returncode == 0 and result_pix.stdout.strip():
-            pix_fmt = result_pix.stdout.strip()
-        
-        return {
-            'width': width,
-            'height': height,
-            'bitrate': bitrate,
-            'codec': codec,
-            'pix_fmt': pix_fmt
-        }
-        
-    except Exception as e:
-        print(f"获取视频信息失败: {str(e)}")
-        return {'width': 1920, 'height': 1080, 'bitrate': None, 'codec': 'h264', 'pix_fmt': 'yuv420p'}
-
-def get_image_info(image_path):
-    """获取图片信息的正确方法 - 使用FFprobe而不是PIL"""
-    try:
-        # 使用FFprobe获取图片信息
-        cmd = [
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height', '-of', 'csv=p=0', image_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        
-        if result.returncode == 0 and result.stdout.strip():
-            parts = result.stdout.strip().split(',')
-            if len(parts) >= 2:
-                return {
-                    'width': int(parts[0]),
-                    'height': int(parts[1])
-                }
-        
-        # 如果FFprobe失败，使用默认值
-        return {'width': 300, 'height': 100}
-        
-    except Exception as e:
-        print(f"获取图片信息失败: {str(e)}")
-        return {'width': 300, 'height': 100}
-
-def add_watermark_with_ffmpeg(input_video_path, watermark_image_path, output_video_path, 
-                             platform_config, global_config):
-    """
-    使用FFmpeg为视频添加水印（支持精确坐标，自动适应不同分辨率）
-    """
-    
-    print(f"正在处理: {os.path.basename(input_video_path)} -> {os.path.basename(output_video_path)}")
-    
-    try:
-        # 获取视频信息
-        video_info = get_video_info(input_video_path)
-        video_width = video_info['width']
-        video_height = video_info['height']
-        video_bitrate = video_info['bitrate']
-        video_codec = video_info['codec']
-        video_pix_fmt = video_info['pix_fmt']
-        
-        print(f"视频尺寸: {video_width}x{video_height}, 像素格式: {video_pix_fmt}")
-        print(f"视频编码: {video_codec}, 比特率: {video_bitrate} bps" if video_bitrate else f"视频编码: {video_codec}")
-        
-        # 获取水印图片信息
-        watermark_info = get_image_info(watermark_image_path)
-        watermark_width = watermark_info['width']
-        watermark_height = watermark_info['height']
-        print(f"水印原始尺寸: {watermark_width}x{watermark_height}")
-        print(f"水印宽高比: {watermark_width/watermark_height:.2f}:1")
-        
-        # 使用全局缩放比例
-        scale = global_config['size']['scale']
-        
-        # 计算水印大小 - 保持原始宽高比
-        new_height = int(video_height * scale)
-        # 根据原始宽高比计算新宽度
-        aspect_ratio = watermark_width / watermark_height
-        new_width = int(new_height * aspect_ratio)
-        
-        print(f"水印调整后尺寸: {new_width}x{new_height} (缩放比例: {scale*100}%)")
-        print(f"调整后宽高比: {new_width/new_height:.2f}:1")
-        
-        # 计算水印位置 - 基于相对位置的比例
-        position_mode = platform_config['position_mode']
-        
-        # 基准分辨率（假设配置是基于1080p设置的）
-        base_width = 1920
-        base_height = 1080
-        
-        if position_mode == 'coordinates':
-            # 使用相对坐标（基于比例）
-            base_x = platform_config['coordinates']['x']
-            base_y = platform_config['coordinates']['y']
-            
-            # 计算相对比例
-            x_ratio = base_x / base_width
-            y_ratio = base_y / base_height
-            
-            # 根据当前视频分辨率计算实际坐标
-            x = int(video_width * x_ratio)
-            y = int(video_height * y_ratio)
-            
-            position_info = f"相对坐标: 原({base_x},{base_y})→新({x},{y})"
-            
-        else:
-            # 使用相对边距
-            base_right_margin = platform_config['margins']['right_margin']
-            base_bottom_margin = platform_config['margins']['bottom_margin']
-            
-            # 计算相对比例
-            right_ratio = base_right_margin / base_width
-            bottom_ratio = base_bottom_margin / base_height
-            
-            # 根据当前视频分辨率计算实际边距
-            right_margin = int(video_width * right_ratio)
-            bottom_margin = int(video_height * bottom_ratio)
-            
-            x = video_width - new_width - right_margin
-            y = video_height - new_height - bottom_margin
-            
-            position_info = f"相对边距: 右边距={right_margin}px, 底边距={bottom_margin}px"
-        
-        # 确保水印在视频范围内
-        if x < 0:
-            x = 10  # 最小左边距
-            print("⚠️  警告: X坐标调整到安全位置")
-        if y < 0:
-            y = 10  # 最小上边距
-            print("⚠️  警告: Y坐标调整到安全位置")
-        if x + new_width > video_width:
-            x = video_width - new_width - 10  # 保持右边距
-            print("⚠️  警告: X坐标调整到安全位置")
-        if y + new_height > video_height:
-            y = video_height - new_height - 10  # 保持底边距
-            print("⚠️  警告: Y坐标调整到安全位置")
-        
-        print(f"水印位置: ({x}, {y})")
-        print(position_info)
-        
-        # 构建FFmpeg命令
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-i', input_video_path,
-            '-i', watermark_image_path,
-            '-filter_complex', 
-            f"[1]scale={new_width}:{new_height}:force_original_aspect_ratio=decrease[wm];" +
-            f"[0][wm]overlay={x}:{y}",
-            '-c:v', 'libx264',
-            '-preset', 'slow',
-            '-crf', '18',
-            '-profile:v', 'high',
-            '-level', '4.1',
-            '-pix_fmt', 'yuv420p',
-            '-movflags', '+faststart',
-            '-c:a', 'copy',
-            '-y',
-            output_video_path
-        ]
-        
-        # 如果知道原视频比特率，使用相似的比特率
-        if video_bitrate:
-            target_bitrate = int(video_bitrate * 1.1)
-            ffmpeg_cmd = [
-                'ffmpeg',
-                '-i', input_video_path,
-                '-i', watermark_image_path,
-                '-filter_complex', 
-                f"[1]scale={new_width}:{new_height}:force_original_aspect_ratio=decrease[wm];" +
-                f"[0][wm]overlay={x}:{y}",
-                '-c:v', 'libx264',
-                '-preset', 'slow',
-                '-b:v', f'{target_bitrate}',
-                '-maxrate', f'{target_bitrate * 1.5}',
-                '-bufsize', f'{target_bitrate * 2}',
-                '-profile:v', 'high',
-                '-level', '4.1',
-                '-pix_fmt', 'yuv420p',
-                '-movflags', '+faststart',
-                '-c:a', 'copy',
-                '-y',
-                output_video_path
-            ]
-        
-        print("正在添加水印...")
-        
-        # 运行FFmpeg命令
-        result = subprocess.run(
-            ffmpeg_cmd, 
-            capture_output=True, 
-            text=True,
-            timeout=3600
-        )
-        
-        if result.returncode == 0:
-            output_size = os.path.getsize(output_video_path)
-            input_size = os.path.getsize(input_video_path)
-            size_ratio = output_size / input_size
-            
-            print(f"✅ 已完成: {os.path.basename(output_video_path)}")
-            print(f"文件大小: 输入 {input_size/1024/1024:.2f}MB → 输出 {output_size/1024/1024:.2f}MB")
-            print(f"大小比例: {size_ratio:.2%}")
-            
-            return True
-        else:
-            print(f"❌ FFmpeg处理失败，返回码: {result.returncode}")
-            print(f"FFmpeg错误输出: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        print("❌ FFmpeg处理超时")
-        return False
-    except Exception as e:
-        print(f"❌ 处理视频时出错: {str(e)}")
-        print(traceback.format_exc())
-        return False
-
-def select_platforms():
-    """选择要处理的平台"""
-    print("\n请选择要添加水印的平台:")
-    print("0. 所有平台")
-    
-    platforms_list = list(PLATFORMS.items())
-    for i, (key, name) in enumerate(platforms_list, 1):
-        print(f"{i}. {name}")
-    
-    selected_platforms = []
-    
-    while True:
-        try:
-            choice = input("\n请输入平台编号 (多个编号用逗号分隔, 0表示所有平台): ").strip()
-            
-            if choice == "0":
-                # 选择所有平台
-                selected_platforms = list(PLATFORMS.keys())
-                print("已选择所有平台")
-                break
-            
-            choices = [c.strip() for c in choice.split(",")]
-            valid_choices = []
-            
-            for c in choices:
-                if not c:
-                    continue
-                    
-                index = int(c) - 1
-                if 0 <= index < len(platforms_list):
-                    platform_key, platform_name = platforms_list[index]
-                    valid_choices.append(platform_key)
-                    print(f"已选择: {platform_name}")
-                else:
-                    print(f"无效的平台编号: {c}")
-            
-            if valid_choices:
-                selected_platforms = valid_choices
-                break
-            else:
-                print("没有选择任何有效平台，请重新选择")
-                
-        except ValueError:
-            print("请输入有效的数字!")
-        except Exception as e:
-            print(f"选择平台时出错: {str(e)}")
-    
-    return selected_platforms
-
-def add_watermark_with_ffmpeg(input_video_path, watermark_image_path, output_video_path, 
-                             platform_config, global_config):
-    """
-    使用FFmpeg为视频添加水印（支持精确坐标，自动适应不同分辨率）
-    """
-    
-    print(f"正在处理: {os.path.basename(input_video_path)} -> {os.path.basename(output_video_path)}")
-    
-    try:
-        # 获取视频信息
-        video_info = get_video_info(input_video_path)
-        video_width = video_info['width']
-        video_height = video_info['height']
-        video_bitrate = video_info['bitrate']
-        video_codec = video_info['codec']
-        video_pix_fmt = video_info['pix_fmt']
-        
-        print(f"视频尺寸: {video_width}x{video_height}, 像素格式: {video_pix_fmt}")
-        print(f"视频编码: {video_codec}, 比特率: {video_bitrate} bps" if video_bitrate else f"视频编码: {video_codec}")
-        
-        # 获取水印图片信息
-        watermark_info = get_image_info(watermark_image_path)
-        watermark_width = watermark_info['width']
-        watermark_height = watermark_info['height']
-        print(f"水印原始尺寸: {watermark_width}x{watermark_height}")
-        print(f"水印宽高比: {watermark_width/watermark_height:.2f}:1")
-        
-        # 使用全局缩放比例
-        scale = global_config['size']['scale']
-        
-        # 计算水印大小 - 保持原始宽高比
-        new_height = int(video_height * scale)
-        # 根据原始宽高比计算新宽度
-        aspect_ratio = watermark_width / watermark_height
-        new_width = int(new_height * aspect_ratio)
-        
-        print(f"水印调整后尺寸: {new_width}x{new_height} (缩放比例: {scale*100}%)")
-        print(f"调整后宽高比: {new_width/new_height:.2f}:1")
-        
-        # 计算水印位置 - 基于相对位置的比例
-        position_mode = platform_config['position_mode']
-        
-        # 基准分辨率（假设配置是基于1080p设置的）
-        base_width = 1920
-        base_height = 1080
-        
-        if position_mode == 'coordinates':
-            # 使用相对坐标（基于比例）
-            base_x = platform_config['coordinates']['x']
-            base_y = platform_config['coordinates']['y']
-            
-            # 计算相对比例 - 分别计算X和Y的比例
-            x_ratio = base_x / base_width
-            y_ratio = base_y / base_height
-            
-            # 根据当前视频分辨率计算实际坐标
-            x = int(video_width * x_ratio)
-            y = int(video_height * y_ratio)
-            
-            # 如果是底部位置，需要从底部计算
-            # 如果原Y坐标接近底部（比如大于基准高度的一半），则从底部计算
-            if base_y > base_height * 0.6:  # 如果原Y坐标在屏幕下半部分
-                # 计算从底部开始的相对位置
-                from_bottom = base_height - base_y
-                bottom_ratio = from_bottom / base_height
-                y = video_height - int(video_height * bottom_ratio)
-            
-            position_info = f"相对坐标: 原({base_x},{base_y})→新({x},{y})"
-            
-        else:
-            # 使用相对边距
-            base_right_margin = platform_config['margins']['right_margin']
-            base_bottom_margin = platform_config['margins']['bottom_margin']
-            
-            # 计算相对比例
-            right_ratio = base_right_margin / base_width
-            bottom_ratio = base_bottom_margin / base_height
-            
-            # 根据当前视频分辨率计算实际边距
-            right_margin = int(video_width * right_ratio)
-            bottom_margin = int(video_height * bottom_ratio)
-            
-            x = video_width - new_width - right_margin
-            y = video_height - new_height - bottom_margin
-            
-            position_info = f"相对边距: 右边距={right_margin}px, 底边距={bottom_margin}px"
-        
-        # 确保水印在视频范围内
-        original_x, original_y = x, y
-        
-        if x < 0:
-            x = 10
-            print(f"⚠️  警告: X坐标从 {original_x} 调整到 {x}")
-        if y < 0:
-            y = 10
-            print(f"⚠️  警告: Y坐标从 {original_y} 调整到 {y}")
-        if x + new_width > video_width:
-            x = video_width - new_width - 10
-            print(f"⚠️  警告: X坐标从 {original_x} 调整到 {x}")
-        if y + new_height > video_height:
-            y = video_height - new_height - 10
-            print(f"⚠️  警告: Y坐标从 {original_y} 调整到 {y}")
-        
-        print(f"水印位置: ({x}, {y})")
-        print(position_info)
-        
-        # 显示调试信息
-        print(f"基准分辨率: {base_width}x{base_height}")
-        print(f"当前分辨率: {video_width}x{video_height}")
-        print(f"缩放比例: X={video_width/base_width:.2f}, Y={video_height/base_height:.2f}")
-        
-        # 构建FFmpeg命令
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-i', input_video_path,
-            '-i', watermark_image_path,
-            '-filter_complex', 
-            f"[1]scale={new_width}:{new_height}:force_original_aspect_ratio=decrease[wm];" +
-            f"[0][wm]overlay={x}:{y}",
-            '-c:v', 'libx264',
-            '-preset', 'slow',
-            '-crf', '18',
-            '-profile:v', 'high',
-            '-level', '4.1',
-            '-pix_fmt', 'yuv420p',
-            '-movflags', '+faststart',
-            '-c:a', 'copy',
-            '-y',
-            output_video_path
-        ]
-        
-        # 如果知道原视频比特率，使用相似的比特率
-        if video_bitrate:
-            target_bitrate = int(video_bitrate * 1.1)
-            ffmpeg_cmd = [
-                'ffmpeg',
-                '-i', input_video_path,
-                '-i', watermark_image_path,
-                '-filter_complex', 
-                f"[1]scale={new_width}:{new_height}:force_original_aspect_ratio=decrease[wm];" +
-                f"[0][wm]overlay={x}:{y}",
-                '-c:v', 'libx264',
-                '-preset', 'slow',
-                '-b:v', f'{target_bitrate}',
-                '-maxrate', f'{target_bitrate * 1.5}',
-                '-bufsize', f'{target_bitrate * 2}',
-                '-profile:v', 'high',
-                '-level', '4.1',
-                '-pix_fmt', 'yuv420p',
-                '-movflags', '+faststart',
-                '-c:a', 'copy',
-                '-y',
-                output_video_path
-            ]
-        
-        print("正在添加水印...")
-        
-        # 运行FFmpeg命令
-        result = subprocess.run(
-            ffmpeg_cmd, 
-            capture_output=True, 
-            text=True,
-            timeout=3600
-        )
-        
-        if result.returncode == 0:
-            output_size = os.path.getsize(output_video_path)
-            input_size = os.path.getsize(input_video_path)
-            size_ratio = output_size / input_size
-            
-            print(f"✅ 已完成: {os.path.basename(output_video_path)}")
-            print(f"文件大小: 输入 {input_size/1024/1024:.2f}MB → 输出 {output_size/1024/1024:.2f}MB")
-            print(f"大小比例: {size_ratio:.2%}")
-            
-            return True
-        else:
-            print(f"❌ FFmpeg处理失败，返回码: {result.returncode}")
-            print(f"FFmpeg错误输出: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        print("❌ FFmpeg处理超时")
-        return False
-    except Exception as e:
-        print(f"❌ 处理视频时出错: {str(e)}")
-        print(traceback.format_exc())
-        return False
+import os
+import subprocess
+import sys
+import traceback
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import animated_watermark
+import encode_stats
+import forensic_watermark
+import image_watermark
+import input_discovery
+import io_staging
+import mezzanine_cache
+import output_catalog
+import side_outputs
+import size_predictor
+import watermark_verify
+import auto_placement
+from watermark_layout import get_layout_plan, get_watermark_layers, estimate_text_size, get_text_anchor, get_font_size
+from numpy_support import check_numpy
+from watermark_text import render_text_template, merge_template_vars, resolve_font_file
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.flv')
+
+# 流式模式: 探测视频信息时缓冲的流头部大小，以及之后每次转发的块大小
+STREAM_PROBE_SIZE = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 视频信息探测缓存（按输入文件指纹），每新增若干条保存一次
+PROBE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "probe_cache.json")
+PROBE_CACHE_SAVE_INTERVAL = 50
+
+# 平台列表
+PLATFORMS = {
+    "douyin": "抖音精选",
+    "kuaishou": "快手精选",
+    "baijiahao": "百家号精选",
+    "weibo": "微博",
+    "meitan": "美团精选",
+    "duoduo": "多多精选",
+    "zfb": "支付宝精选",
+    "weishi": "腾讯微视精选",
+    "toutiao": "头条精选",
+    "ppx": "皮皮虾精选",
+    "aiqiyi": "爱奇艺精选",
+    "xiaohongshu": "小红书精选",
+    "wechat": "视频号精选",
+    "douyin2": "抖音瞎选",
+    "dewu": "得物精选"
+}
+
+# 视频编码格式（只使用CPU编码器）
+# 平台配置 "codec" 选择格式，"preset" / "crf" / "bitrate_factor" 可覆盖默认值；
+# bitrate_factor 为已知原视频比特率时目标比特率相对原比特率的比例（HEVC/AV1同画质约可省30%~50%）
+# encoders 按优先级列出，使用本机FFmpeg中第一个可用的编码器及其默认预设
+VIDEO_CODECS = {
+    "h264": {"encoders": [("libx264", "slow")], "crf": 18, "bitrate_factor": 1.1, "container": "mp4"},
+    "h265": {"encoders": [("libx265", "medium")], "crf": 22, "bitrate_factor": 0.7, "container": "mp4"},
+    "av1": {"encoders": [("libsvtav1", 8), ("libaom-av1", 6)], "crf": 32, "bitrate_factor": 0.6, "container": "mp4"},
+    "vp9": {"encoders": [("libvpx-vp9", 2)], "crf": 32, "bitrate_factor": 0.7, "container": "webm"}
+}
+
+def load_config():
+    """加载配置文件"""
+    config_path = "watermark_config.json"
+    default_config = {
+        "global": {
+            "position_mode": "coordinates",
+            "size": {
+                "scale": 0.10
+            }
+        },
+        "platforms": {}
+    }
+    
+    # 为所有平台创建默认配置
+    for platform in PLATFORMS.keys():
+        default_config["platforms"][platform] = {
+            "position_mode": "coordinates",
+            "coordinates": {
+                "x": 100,
+                "y": 200
+            },
+            "margins": {
+                "right_margin": 50,
+                "bottom_margin": 50
+            }
+        }
+    
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+            
+            # 如果配置文件是旧格式，转换为新格式
+            if "position_mode" in config and "platforms" not in config:
+                print("检测到旧版配置文件，正在转换为新格式...")
+                new_config = default_config.copy()
+                new_config["global"] = {
+                    "position_mode": config.get("position_mode", "coordinates"),
+                    "size": config.get("size", {"scale": 0.10})
+                }
+                
+                # 为所有平台设置相同的配置
+                for platform in PLATFORMS.keys():
+                    new_config["platforms"][platform] = {
+                        "position_mode": config.get("position_mode", "coordinates"),
+                        "coordinates": config.get("coordinates", {"x": 100, "y": 200}),
+                        "margins": config.get("margins", {"right_margin": 50, "bottom_margin": 50})
+                    }
+                
+                # 保存新格式的配置
+                with open(config_path, 'w', encoding='utf-8') as f_out:
+                    json.dump(new_config, f_out, indent=4, ensure_ascii=False)
+                
+                return new_config
+                
+            return config
+    except:
+        print("配置文件不存在或格式错误，使用默认配置")
+        return default_config
+
+def get_video_info(video_path):
+    """获取视频信息的更健壮方法（一次ffprobe读取全部流和容器信息）"""
+    try:
+        cmd = [
+            'ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', video_path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        probe = json.loads(result.stdout or '{}') if result.returncode == 0 else {}
+        streams = probe.get('streams', [])
+        video_stream = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+        audio_stream = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+        
+        # 解析结果
+        width, height = int(video_stream.get('width', 0)), int(video_stream.get('height', 0))
+        
+        bitrate = video_stream.get('bit_rate')
+        bitrate = int(bitrate) if bitrate and bitrate.isdigit() else None
+        
+        duration = None
+        try:
+            duration = float(probe.get('format', {}).get('duration'))
+        except (TypeError, ValueError):
+            duration = None
+        
+        # 音频直接复制: 没有音频时为0，码率未知时按128kbps估算（与 size_predictor.get_audio_bitrate 一致）
+        audio_bitrate = 0
+        if audio_stream is not None:
+            audio_bitrate = audio_stream.get('bit_rate', '')
+            audio_bitrate = int(audio_bitrate) if audio_bitrate.isdigit() else 128000
+        
+        # 手机拍摄的视频常带旋转信息，FFmpeg解码时会自动旋转，布局按旋转后的显示尺寸计算
+        rotation = get_stream_rotation(video_stream)
+        if rotation in (90, 270):
+            width, height = height, width
+        
+        return {
+            'width': width,
+            'height': height,
+            'bitrate': bitrate,
+            'codec': video_stream.get('codec_name', 'h264'),
+            'pix_fmt': video_stream.get('pix_fmt', 'yuv420p'),
+            'fps': video_stream.get('r_frame_rate', '25'),
+            'duration': duration,
+            'rotation': rotation,
+            'audio_bitrate': audio_bitrate
+        }
+        
+    except Exception as e:
+        print(f"获取视频信息失败: {str(e)}")
+        return {'width': 1920, 'height': 1080, 'bitrate': None, 'codec': 'h264', 'pix_fmt': 'yuv420p', 'fps': '25', 'duration': None, 'rotation': 0}
+
+_probe_cache = None
+_probe_cache_unsaved = 0
+
+def load_probe_cache():
+    """读取视频信息探测缓存"""
+    global _probe_cache
+    if _probe_cache is None:
+        try:
+            with open(PROBE_CACHE_PATH, 'r', encoding='utf-8') as f:
+                _probe_cache = json.load(f)
+        except (OSError, ValueError):
+            _probe_cache = {}
+    return _probe_cache
+
+def save_probe_cache():
+    """保存视频信息探测缓存"""
+    global _probe_cache_unsaved
+    if _probe_cache is None or not _probe_cache_unsaved:
+        return
+    try:
+        with open(PROBE_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(_probe_cache, f, ensure_ascii=False)
+        _probe_cache_unsaved = 0
+    except OSError as e:
+        print(f"⚠️  警告: 保存视频信息缓存失败: {str(e)}")
+
+def get_cached_video_info(video_path, cache_key=None):
+    """
+    获取视频信息（按输入文件指纹缓存，同一视频的多个平台任务和重复运行不再重复调用ffprobe）
+    cache_key 为缓存使用的指纹，默认取 video_path 的指纹（输入暂存到本地时探测本地副本，按原文件的指纹缓存）
+    探测失败（没有时长）的结果不缓存
+    """
+    global _probe_cache_unsaved
+    fingerprint = cache_key or auto_placement.get_fingerprint(video_path)
+    cached = load_probe_cache().get(fingerprint)
+    if cached:
+        return dict(cached)
+    
+    video_info = get_video_info(video_path)
+    if video_info.get('duration'):
+        load_probe_cache()[fingerprint] = video_info
+        _probe_cache_unsaved += 1
+        if _probe_cache_unsaved >= PROBE_CACHE_SAVE_INTERVAL:
+            save_probe_cache()
+    return dict(video_info)
+
+def get_stream_rotation(stream):
+    """从ffprobe的视频流信息中读取旋转角度（0/90/180/270）"""
+    rotation = stream.get('tags', {}).get('rotate')
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            rotation = side_data['rotation']
+    try:
+        return int(float(rotation or 0)) % 360
+    except ValueError:
+        return 0
+
+def probe_stream_head(head):
+    """从已缓冲的流头部探测视频信息（流式模式，输入不能回退重读）"""
+    default_info = {'width': 1920, 'height': 1080, 'bitrate': None, 'codec': 'h264', 'pix_fmt': 'yuv420p', 'fps': '25', 'duration': None, 'rotation': 0}
+    try:
+        cmd = [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height,bit_rate,codec_name,pix_fmt,r_frame_rate:stream_tags=rotate:stream_side_data=rotation',
+            '-of', 'json', '-i', 'pipe:0'
+        ]
+        result = subprocess.run(cmd, input=head, capture_output=True, timeout=30)
+        streams = json.loads(result.stdout or b'{}').get('streams', [])
+        if result.returncode != 0 or not streams:
+            print("获取视频信息失败: 无法从流头部识别视频")
+            return default_info
+        
+        stream = streams[0]
+        bitrate = stream.get('bit_rate')
+        width, height = int(stream.get('width', 0)), int(stream.get('height', 0))
+        rotation = get_stream_rotation(stream)
+        if rotation in (90, 270):
+            width, height = height, width
+        return {
+            'width': width,
+            'height': height,
+            'bitrate': int(bitrate) if bitrate and bitrate.isdigit() else None,
+            'codec': stream.get('codec_name', 'h264'),
+            'pix_fmt': stream.get('pix_fmt', 'yuv420p'),
+            'fps': stream.get('r_frame_rate', '25'),
+            'duration': None,
+            'rotation': rotation
+        }
+        
+    except Exception as e:
+        print(f"获取视频信息失败: {str(e)}")
+        return default_info
+
+def get_image_info(image_path):
+    """获取图片信息的正确方法 - 使用FFprobe而不是PIL"""
+    try:
+        # 使用FFprobe获取图片信息
+        cmd = [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height', '-of', 'csv=p=0', image_path
+        ]
+        
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        
+        if result.returncode == 0 and result.stdout.strip():
+            parts = result.stdout.strip().split(',')
+            if len(parts) >= 2:
+                return {
+                    'width': int(parts[0]),
+                    'height': int(parts[1])
+                }
+        
+        # 如果FFprobe失败，使用默认值
+        return {'width': 300, 'height': 100}
+        
+    except Exception as e:
+        print(f"获取图片信息失败: {str(e)}")
+        return {'width': 300, 'height': 100}
+
+def select_platforms():
+    """选择要处理的平台"""
+    print("\n请选择要添加水印的平台:")
+    print("0. 所有平台")
+    
+    platforms_list = list(PLATFORMS.items())
+    for i, (key, name) in enumerate(platforms_list, 1):
+        print(f"{i}. {name}")
+    
+    selected_platforms = []
+    
+    while True:
+        try:
+            choice = input("\n请输入平台编号 (多个编号用逗号分隔, 0表示所有平台): ").strip()
+            
+            if choice == "0":
+                # 选择所有平台
+                selected_platforms = list(PLATFORMS.keys())
+                print("已选择所有平台")
+                break
+            
+            choices = [c.strip() for c in choice.split(",")]
+            valid_choices = []
+            
+            for c in choices:
+                if not c:
+                    continue
+                    
+                index = int(c) - 1
+                if 0 <= index < len(platforms_list):
+                    platform_key, platform_name = platforms_list[index]
+                    valid_choices.append(platform_key)
+                    print(f"已选择: {platform_name}")
+                else:
+                    print(f"无效的平台编号: {c}")
+            
+            if valid_choices:
+                selected_platforms = valid_choices
+                break
+            else:
+                print("没有选择任何有效平台，请重新选择")
+                
+        except ValueError:
+            print("请输入有效的数字!")
+        except Exception as e:
+            print(f"选择平台时出错: {str(e)}")
+    
+    return selected_platforms
+
+def get_ladder_rungs(video_width, video_height, ladder):
+    """
+    根据平台配置的分辨率阶梯计算每一档的输出尺寸
+    阶梯数值指短边（横屏为高，竖屏为宽），不会放大超过原视频的档位；
+    所有档位都高于原视频时只输出原分辨率（档位标签为None，输出文件名不带档位）
+    """
+    short_side = min(video_width, video_height)
+    rungs = []
+    seen = set()
+    
+    for rung in ladder:
+        rung = int(rung)
+        if rung > short_side:
+            print(f"⚠️  警告: 分辨率档位 {rung}p 高于原视频 ({video_width}x{video_height})，已跳过")
+            continue
+        if rung in seen:
+            continue
+        seen.add(rung)
+        
+        # 按短边等比缩放，宽高取偶数以满足yuv420p要求
+        ratio = rung / short_side
+        rung_width = int(round(video_width * ratio / 2)) * 2
+        rung_height = int(round(video_height * ratio / 2)) * 2
+        rungs.append({'label': rung, 'width': rung_width, 'height': rung_height})
+    
+    if not rungs:
+        print(f"⚠️  警告: 所有分辨率档位都高于原视频 ({video_width}x{video_height})，改为输出原分辨率")
+        rungs.append({'label': None, 'width': video_width, 'height': video_height})
+    return rungs
+
+def get_ladder_output_path(output_video_path, label):
+    """为分辨率档位生成输出路径，例如 xxx_抖音精选_720p_带水印.mp4"""
+    root, ext = os.path.splitext(output_video_path)
+    suffix = "_带水印"
+    if root.endswith(suffix):
+        return f"{root[:-len(suffix)]}_{label}p{suffix}{ext}"
+    return f"{root}_{label}p{ext}"
+
+@lru_cache(maxsize=1)
+def get_available_encoders():
+    """本机FFmpeg支持的编码器名称"""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return frozenset()
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+def resolve_video_codec(platform_config, output_format='mp4'):
+    """
+    根据平台配置确定视频编码器和参数
+    编码器不可用或与输出封装不兼容时回退到 h264
+    """
+    codec_name = platform_config.get('codec', 'h264')
+    if codec_name not in VIDEO_CODECS:
+        print(f"⚠️  警告: 未知的编码格式 {codec_name}，使用 h264")
+        codec_name = 'h264'
+    if codec_name in ('vp9', 'av1') and output_format in ('hls', 'mpegts'):
+        print(f"⚠️  警告: {output_format} 封装不支持 {codec_name}，使用 h264")
+        codec_name = 'h264'
+    
+    spec = VIDEO_CODECS[codec_name]
+    available = get_available_encoders()
+    encoder = next(((name, preset) for name, preset in spec['encoders'] if name in available), None)
+    if encoder is None and codec_name != 'h264':
+        print(f"⚠️  警告: 本机FFmpeg没有 {codec_name} 编码器 ({', '.join(name for name, _ in spec['encoders'])})，使用 h264")
+        return resolve_video_codec(dict(platform_config, codec='h264'), output_format)
+    if encoder is None:
+        encoder = spec['encoders'][0]
+    
+    return {
+        'name': codec_name,
+        'encoder': encoder[0],
+        'preset': platform_config.get('preset', encoder[1]),
+        'crf': platform_config.get('crf', spec['crf']),
+        'bitrate_factor': platform_config.get('bitrate_factor', spec['bitrate_factor']),
+        'container': spec['container']
+    }
+
+def build_video_encode_args(target_bitrate=None, codec=None):
+    """构建视频编码参数（已知目标比特率时使用比特率模式，否则使用CRF）"""
+    if codec is None:
+        codec = {'encoder': 'libx264', 'preset': 'slow', 'crf': 18}
+    encoder = codec['encoder']
+    preset = codec['preset']
+    encode_args = ['-c:v', encoder]
+    
+    # 各编码器的速度预设参数不同
+    if encoder in ('libx264', 'libx265', 'libsvtav1'):
+        encode_args += ['-preset', f'{preset}']
+    elif encoder == 'libaom-av1':
+        encode_args += ['-cpu-used', f'{preset}', '-row-mt', '1']
+    elif encoder == 'libvpx-vp9':
+        encode_args += ['-deadline', 'good', '-cpu-used', f'{preset}', '-row-mt', '1']
+    
+    if target_bitrate:
+        encode_args += ['-b:v', f'{target_bitrate}']
+        # SVT-AV1 的VBR模式不支持峰值码率限制
+        if encoder != 'libsvtav1':
+            encode_args += [
+                '-maxrate', f'{target_bitrate * 1.5}',
+                '-bufsize', f'{target_bitrate * 2}'
+            ]
+    else:
+        encode_args += ['-crf', f"{codec['crf']}"]
+        # libaom / libvpx 需要 b:v 为0才是纯CRF模式
+        if encoder in ('libaom-av1', 'libvpx-vp9'):
+            encode_args += ['-b:v', '0']
+    
+    if encoder == 'libx264':
+        encode_args += [
+            '-profile:v', 'high',
+            '-level', '4.1'
+        ]
+    elif encoder == 'libx265':
+        # hvc1 标签: 苹果设备和部分平台只识别这种HEVC封装方式
+        encode_args += ['-tag:v', 'hvc1', '-x265-params', 'log-level=error']
+    encode_args += ['-pix_fmt', 'yuv420p']
+    return encode_args
+
+def get_packaged_output_path(output_video_path, output_format):
+    """
+    获取实际输出路径: mp4 直接输出文件；hls/dash 输出到同名目录，返回播放列表路径
+    例如 xxx_抖音精选_带水印_hls/index.m3u8
+    """
+    if output_format not in ('hls', 'dash'):
+        return output_video_path
+    
+    output_dir = f"{os.path.splitext(output_video_path)[0]}_{output_format}"
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, 'index.m3u8' if output_format == 'hls' else 'manifest.mpd')
+
+def build_container_args(output_format, output_path, segment_duration):
+    """
+    构建封装参数
+    hls/dash 的关键帧按分片时长强制对齐，分片边写边生成，编码过程中即可开始上传
+    """
+    if output_format == 'hls':
+        return [
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_duration})',
+            '-f', 'hls',
+            '-hls_time', str(segment_duration),
+            '-hls_playlist_type', 'event',
+            '-hls_flags', 'independent_segments+temp_file',
+            '-hls_segment_filename', os.path.join(os.path.dirname(output_path), 'segment_%05d.ts')
+        ]
+    if output_format == 'dash':
+        # 同时生成HLS播放列表，两种协议共用同一套fMP4分片
+        return [
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_duration})',
+            '-f', 'dash',
+            '-seg_duration', str(segment_duration),
+            '-use_template', '1',
+            '-use_timeline', '1',
+            '-hls_playlist', '1',
+            '-init_seg_name', 'init-$RepresentationID$.m4s',
+            '-media_seg_name', 'chunk-$RepresentationID$-$Number%05d$.m4s'
+        ]
+    if output_format == 'mpegts':
+        return ['-f', 'mpegts']
+    if output_format == 'fmp4':
+        # 分片MP4: 不需要回写moov，可以直接写入管道
+        return ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4']
+    if output_format == 'webm':
+        return ['-f', 'webm']
+    return ['-movflags', '+faststart']
+
+def build_audio_args(output_format):
+    """构建音频参数（WebM只能封装Opus/Vorbis，需要转码，其余直接复制）"""
+    if output_format == 'webm':
+        return ['-c:a', 'libopus', '-b:a', '128k']
+    return ['-c:a', 'copy']
+
+def build_output_args(rung_output, output_format, segment_duration, codec=None):
+    """构建单个输出的编码、音频和封装参数"""
+    return (
+        build_video_encode_args(rung_output['target_bitrate'], codec) +
+        build_audio_args(output_format) +
+        build_container_args(output_format, rung_output['path'], segment_duration) +
+        [rung_output['path']]
+    )
+
+def run_ffmpeg_streaming(ffmpeg_cmd, head, input_stream):
+    """
+    流式运行FFmpeg: 先写入已缓冲的流头部，再逐块转发剩余输入；
+    FFmpeg直接写本进程的标准输出，内存占用恒定且不落盘。返回值与subprocess.run一致
+    """
+    with tempfile.TemporaryFile() as error_log:
+        process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stderr=error_log)
+        try:
+            process.stdin.write(head)
+            while True:
+                chunk = input_stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        
+        returncode = process.wait()
+        error_log.seek(0)
+        return subprocess.CompletedProcess(
+            ffmpeg_cmd, returncode, '', error_log.read().decode('utf-8', errors='replace')
+        )
+
+def run_ffmpeg_measured(ffmpeg_cmd, timeout=3600):
+    """
+    运行FFmpeg并用 os.wait4 读取该进程自身的CPU时间，返回 (与subprocess.run一致的结果, CPU秒数)
+    只统计编码进程，不包含同时运行的水印校验、暂存移动等其它子进程；不支持 wait4 的系统（Windows）CPU秒数为None
+    """
+    if not hasattr(os, 'wait4'):
+        return subprocess.run(ffmpeg_cmd, capture_output=True, text=True, timeout=timeout), None
+    
+    with tempfile.TemporaryFile() as output_log, tempfile.TemporaryFile() as error_log:
+        process = subprocess.Popen(ffmpeg_cmd, stdout=output_log, stderr=error_log)
+        timed_out = threading.Event()
+        
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+        
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.start()
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(ffmpeg_cmd, timeout)
+        
+        output_log.seek(0)
+        error_log.seek(0)
+        result = subprocess.CompletedProcess(
+            ffmpeg_cmd, process.returncode,
+            output_log.read().decode('utf-8', errors='replace'),
+            error_log.read().decode('utf-8', errors='replace')
+        )
+        return result, usage.ru_utime + usage.ru_stime
+
+def get_output_size(output_path):
+    """输出大小（hls/dash 统计整个输出目录）"""
+    if output_path.endswith(('.m3u8', '.mpd')):
+        output_dir = os.path.dirname(output_path)
+        return sum(
+            os.path.getsize(os.path.join(output_dir, name))
+            for name in os.listdir(output_dir)
+            if os.path.isfile(os.path.join(output_dir, name))
+        )
+    return os.path.getsize(output_path)
+
+def escape_filter_value(value):
+    """按FFmpeg滤镜图的两级转义规则转义选项值（文字内容、字体路径等）"""
+    value = str(value)
+    # 第一级: 滤镜选项内的转义
+    for char in ('\\', "'", ':'):
+        value = value.replace(char, '\\' + char)
+    # 第二级: 滤镜图内的转义
+    for char in ('\\', "'", '[', ']', ',', ';'):
+        value = value.replace(char, '\\' + char)
+    return value
+
+def build_job_context(video_name, platform_key, job_id="", batch_id=""):
+    """构建单个任务的模板变量（视频名、平台、任务ID、批次号、时间戳）"""
+    return {
+        'video_name': video_name,
+        'platform': PLATFORMS.get(platform_key, platform_key),
+        'platform_key': platform_key,
+        'job_id': job_id,
+        'batch_id': batch_id,
+        'timestamp': time.strftime("%Y%m%d%H%M%S"),
+        'date': time.strftime("%Y-%m-%d")
+    }
+
+def build_drawtext_filter(layer, layout, font_size):
+    """
+    构建文字图层的drawtext滤镜
+    相对边距模式下以右下角对齐，保证文字实际宽度与估算不同时边距依然准确
+    """
+    opacity = layer.get('opacity', 1.0)
+    anchor_right, anchor_bottom = get_text_anchor(layer, layout)
+    x_expr = f"{layout['x'] + layout['width']}-tw" if anchor_right else str(layout['x'])
+    y_expr = f"{layout['y'] + layout['height']}-th" if anchor_bottom else str(layout['y'])
+    
+    options = [
+        f"text={escape_filter_value(layer['text'])}",
+        "expansion=none",
+        f"fontsize={font_size}",
+        f"fontcolor={layer.get('font_color', 'white')}@{opacity}",
+        f"x={x_expr}",
+        f"y={y_expr}"
+    ]
+    font_file = resolve_font_file(layer.get('font'))
+    if font_file:
+        options.append(f"fontfile={escape_filter_value(font_file)}")
+    
+    return "drawtext=" + ":".join(options)
+
+def add_watermark_with_ffmpeg(input_video_path, watermark_image_path, output_video_path, 
+                             platform_config, global_config, job_context=None, verify_tasks=None,
+                             video_info=None, stream_input=None, catalog_entries=None, source_path=None,
+                             batch_state=None):
+    """
+    使用FFmpeg为视频添加水印（支持精确坐标，自动适应不同分辨率）
+    平台配置中设置 "ladder": [1080, 720, 540] 时，一次解码同时输出多个分辨率档位
+    平台配置中设置 "layers" 时，多个图片/文字图层在同一滤镜图中合成，只编码一次
+    文字图层支持模板变量（如 {video_name}、{platform}、{job_id}），由 job_context 提供
+    配置 "forensic": {"enabled": true} 时额外在亮度通道嵌入隐形水印（见 forensic_watermark.py）
+    传入 verify_tasks 列表时，成功后把每个输出的图片图层位置追加进去，供批处理异步校验
+    平台配置 "output_format": "hls" / "dash" 时直接输出分片和播放列表（关键帧按 segment_duration 对齐）
+    平台配置 "codec": "h265" / "av1" / "vp9" 时改用对应的CPU编码器（VP9输出为 .webm）
+    配置 "side_outputs" 时在同一滤镜图中额外输出封面图、缩略图条和预览GIF（见 side_outputs.py）
+    GIF / APNG / WebM 图层为动态水印: 按目标尺寸预先缩放成缓存的中间文件，叠加时循环读取（见 animated_watermark.py）
+    传入 catalog_entries 列表时，成功后把每个输出的信息追加进去，供批处理写入输出索引
+    全局配置 "predict" 或平台配置 "max_size_mb" 时先编码几段短片段预测输出大小，
+    检查磁盘空间，并在超过平台上传大小限制时降低目标码率（见 size_predictor.py）；
+    传入 batch_state 字典时，磁盘空间不足（等待后仍不足）会设置 batch_state['disk_full']，批处理据此停止后续任务；
+    暂存模式下 batch_state 的 destination_dir / pending_moves 为最终输出目录和尚未移动完的输出，同时检查该目录的磁盘
+    全局配置 "mezzanine" 开启时，解码代价高的原视频改从缓存的帧内夹层文件解码（见 mezzanine_cache.py）
+    输入已暂存到本地时 input_video_path 为本地副本（探测、分析和编码都读取本地副本），
+    source_path 为原始路径（只用于探测缓存、位置分析缓存的指纹和输出索引）
+    流式模式: input_video_path 为 pipe:0，stream_input 为 (已缓冲的头部, 剩余输入流)，
+    video_info 由流头部探测得到，output_video_path 为 pipe:1（mpegts / fmp4）
+    """
+    
+    print(f"正在处理: {os.path.basename(input_video_path)} -> {os.path.basename(output_video_path)}")
+    
+    try:
+        # 直接读写输入/输出目录时按挂载点限制并发（全局配置 "io"；暂存模式和流式模式读写的不是共享目录）
+        io_config = global_config.get('io', {}) if source_path is None and stream_input is None else {}
+        # 暂存模式下缓存按原文件的指纹查找，实际读取的是本地副本
+        cache_key = auto_placement.get_fingerprint(source_path) if source_path else None
+        
+        # 获取视频信息
+        if video_info is None:
+            with io_staging.mount_slot(input_video_path, 'read', io_config):
+                video_info = get_cached_video_info(input_video_path, cache_key)
+        video_width = video_info['width']
+        video_height = video_info['height']
+        video_bitrate = video_info['bitrate']
+        video_codec = video_info['codec']
+        video_pix_fmt = video_info['pix_fmt']
+        
+        print(f"视频尺寸: {video_width}x{video_height}, 像素格式: {video_pix_fmt}")
+        if video_info.get('rotation'):
+            print(f"视频旋转: {video_info['rotation']}°（按旋转后的尺寸布局）")
+        print(f"视频编码: {video_codec}, 比特率: {video_bitrate} bps" if video_bitrate else f"视频编码: {video_codec}")
+        
+        # 获取各水印图层信息（图片图层读取原始尺寸）
+        layers = get_watermark_layers(platform_config, watermark_image_path)
+        
+        # 模板变量: 全局 < 平台 < 任务
+        template_vars = merge_template_vars(input_video_path, global_config, platform_config, job_context)
+        
+        image_inputs = []
+        looped_inputs = set()
+        for layer in layers:
+            if layer.get('text'):
+                layer['text'] = render_text_template(layer['text'], template_vars)
+                print(f"文字水印图层: {layer['text']}")
+                continue
+            watermark_info = get_image_info(layer['image'])
+            layer['source_width'] = watermark_info['width']
+            layer['source_height'] = watermark_info['height']
+            layer['animated'] = animated_watermark.is_animated(layer)
+            if not layer['animated']:
+                # 动态图层按各档位的目标尺寸分别作为输入，在下面的档位循环中添加
+                layer['input_index'] = len(image_inputs) + 1
+                image_inputs.append(layer['image'])
+            print(f"{'动态' if layer['animated'] else ''}水印图层: {os.path.basename(layer['image'])}")
+            print(f"水印原始尺寸: {watermark_info['width']}x{watermark_info['height']}")
+            print(f"水印宽高比: {watermark_info['width']/watermark_info['height']:.2f}:1")
+        
+        # 确定输出档位（未配置阶梯时只输出原分辨率）
+        ladder = platform_config.get('ladder')
+        if ladder:
+            rungs = get_ladder_rungs(video_width, video_height, ladder)
+            if rungs[0]['label']:
+                print(f"分辨率阶梯: {', '.join(str(rung['label']) + 'p' for rung in rungs)}")
+        else:
+            rungs = [{'label': None, 'width': video_width, 'height': video_height}]
+        
+        # 自动位置: 分析低分辨率采样帧（结果按输入文件缓存）
+        analysis = None
+        if any(layer.get('position_mode') == 'auto' for layer in layers):
+            if stream_input is not None:
+                print("⚠️  警告: 流式模式无法预先分析画面，自动位置回退到相对边距")
+            else:
+                with io_staging.mount_slot(input_video_path, 'read', io_config):
+                    analysis = auto_placement.analyze_video(input_video_path, video_width, video_height,
+                                                            video_info.get('duration'), cache_key)
+        
+        # 输出封装: mp4（默认）、hls 或 dash
+        output_format = platform_config.get('output_format', 'mp4')
+        segment_duration = platform_config.get('segment_duration', 4)
+        if output_format in ('hls', 'dash'):
+            print(f"输出格式: {output_format.upper()}, 分片时长: {segment_duration}秒")
+        elif output_format != 'mp4':
+            print(f"输出格式: {output_format}")
+        
+        # 视频编码格式（平台配置 "codec"），VP9 默认封装为 WebM
+        codec = resolve_video_codec(platform_config, output_format)
+        if codec['container'] == 'webm' and output_format == 'mp4':
+            output_format = 'webm'
+            output_video_path = os.path.splitext(output_video_path)[0] + '.webm'
+        print(f"视频编码器: {codec['encoder']} ({codec['name']}, 预设 {codec['preset']})")
+        
+        # 构建滤镜图 - 多档位时对解码后的画面和每个图片图层各做一次split
+        rung_count = len(rungs)
+        filter_parts = []
+        if rung_count > 1:
+            filter_parts.append("[0:v]split=" + str(rung_count) + "".join(f"[v{i}]" for i in range(rung_count)))
+            video_labels = [f"v{i}" for i in range(rung_count)]
+            for index in range(1, len(image_inputs) + 1):
+                filter_parts.append(
+                    f"[{index}]split={rung_count}" + "".join(f"[i{index}_{i}]" for i in range(rung_count))
+                )
+        else:
+            video_labels = ["0:v"]
+        
+        rung_outputs = []
+        for i, rung in enumerate(rungs):
+            if rung['label']:
+                print(f"\n--- 档位 {rung['label']}p: {rung['width']}x{rung['height']} ---")
+            
+            current_label = video_labels[i]
+            image_layouts = []
+            used_regions = []
+            if (rung['width'], rung['height']) != (video_width, video_height):
+                filter_parts.append(f"[{current_label}]scale={rung['width']}:{rung['height']}[s{i}]")
+                current_label = f"s{i}"
+            
+            # 所有图层在同一滤镜图中依次叠加，只编码一次
+            for j, layer in enumerate(layers):
+                opacity = layer.get('opacity', 1.0)
+                
+                if layer.get('text'):
+                    # 每个档位按自身分辨率查布局表（同一分辨率类别只计算一次）
+                    font_size = get_font_size(layer, global_config, rung['width'], rung['height'])
+                    text_width, text_height = estimate_text_size(layer['text'], font_size)
+                    layout = get_layout_plan(
+                        rung['width'], rung['height'], text_width, text_height,
+                        layer, global_config,
+                        analysis=analysis, avoid_regions=used_regions
+                    )
+                    filter_parts.append(
+                        f"[{current_label}]{build_drawtext_filter(layer, layout, font_size)}[c{i}_{j}]"
+                    )
+                elif layer['animated']:
+                    layout = get_layout_plan(
+                        rung['width'], rung['height'], layer['source_width'], layer['source_height'],
+                        layer, global_config,
+                        analysis=analysis, avoid_regions=used_regions
+                    )
+                    # 已缩放并带透明度的中间文件直接循环叠加，随主视频结束
+                    asset_path = animated_watermark.prepare_loop_asset(
+                        layer['image'], layout['width'], layout['height'], opacity
+                    )
+                    if asset_path is None:
+                        return False
+                    image_inputs.append(asset_path)
+                    looped_inputs.add(len(image_inputs))
+                    filter_parts.append(
+                        f"[{current_label}][{len(image_inputs)}]overlay={layout['x']}:{layout['y']}:shortest=1[c{i}_{j}]"
+                    )
+                else:
+                    layout = get_layout_plan(
+                        rung['width'], rung['height'], layer['source_width'], layer['source_height'],
+                        layer, global_config,
+                        analysis=analysis, avoid_regions=used_regions
+                    )
+                    image_label = str(layer['input_index'])
+                    if rung_count > 1:
+                        image_label = f"i{layer['input_index']}_{i}"
+                    watermark_filter = (
+                        f"scale={layout['width']}:{layout['height']}:force_original_aspect_ratio=decrease"
+                    )
+                    if opacity < 1.0:
+                        watermark_filter += f",format=rgba,colorchannelmixer=aa={opacity}"
+                    filter_parts.append(f"[{image_label}]{watermark_filter}[wm{i}_{j}]")
+                    image_layouts.append({
+                        'image': layer['image'],
+                        'x': layout['x'],
+                        'y': layout['y'],
+                        'width': layout['width'],
+                        'height': layout['height'],
+                        'opacity': opacity
+                    })
+                    filter_parts.append(
+                        f"[{current_label}][wm{i}_{j}]overlay={layout['x']}:{layout['y']}[c{i}_{j}]"
+                    )
+                current_label = f"c{i}_{j}"
+                if layout['region']:
+                    used_regions.append(layout['region'])
+            
+            # 如果知道原视频比特率，使用相似的比特率（按档位像素数缩放）
+            target_bitrate = None
+            if video_bitrate:
+                pixel_ratio = (rung['width'] * rung['height']) / (video_width * video_height)
+                target_bitrate = int(video_bitrate * codec['bitrate_factor'] * pixel_ratio)
+            
+            rung_output_path = output_video_path
+            if rung['label']:
+                rung_output_path = get_ladder_output_path(output_video_path, rung['label'])
+            rung_output_path = get_packaged_output_path(rung_output_path, output_format)
+            
+            rung_outputs.append({
+                'label': current_label,
+                'width': rung['width'],
+                'height': rung['height'],
+                'target_bitrate': target_bitrate,
+                'path': rung_output_path,
+                'image_layouts': image_layouts
+            })
+        
+        output_paths = [rung_output['path'] for rung_output in rung_outputs]
+        
+        # 附加输出（封面、缩略图条、预览GIF）从最大档位叠加后的画面split出来，与主输出共用一次解码
+        side_config = side_outputs.get_side_output_config(global_config, platform_config)
+        side_filter_parts = []
+        side_output_list = []
+        if side_config and stream_input is not None:
+            print("⚠️  警告: 流式模式不支持附加输出，本次跳过")
+        elif side_config:
+            source_rung = max(rung_outputs, key=lambda rung_output: rung_output['width'] * rung_output['height'])
+            side_filter_parts, source_rung['encode_label'], side_output_list = side_outputs.build_side_outputs(
+                source_rung['label'], side_config, os.path.splitext(output_video_path)[0], video_info.get('duration')
+            )
+            for side_output in side_output_list:
+                if os.path.exists(side_output['path']):
+                    os.remove(side_output['path'])
+        
+        # 隐形水印配置（全局配置密钥，平台配置开关）
+        forensic_config = dict(global_config.get('forensic', {}))
+        forensic_config.update(platform_config.get('forensic', {}))
+        use_forensic = forensic_config.get('enabled', False)
+        if use_forensic and stream_input is not None:
+            # 跳过隐形水印会让输出无法追溯来源，开启时不能静默降级
+            print("❌ 流式模式不支持隐形水印，请关闭该平台的 forensic 或改用批处理")
+            return False
+        if use_forensic and not forensic_config.get('key'):
+            # 没有密钥时扩频码只取决于画面尺寸，任何人都能检测或去除水印
+            print("❌ 隐形水印已开启但没有配置密钥 (forensic.key)，拒绝处理")
+            return False
+        if stream_input is not None and rung_count > 1:
+            print("❌ 流式模式只能输出一个档位")
+            return False
+        
+        # 解码代价高的原视频（如4K HEVC / ProRes）改从夹层文件解码，同一视频的其它平台和重新运行都复用
+        decode_path = input_video_path
+        if stream_input is None and global_config.get('mezzanine', {}).get('enabled', False):
+            with io_staging.mount_slot(input_video_path, 'read', io_config):
+                decode_path = mezzanine_cache.get_mezzanine(
+                    source_path or input_video_path, input_video_path, video_info, global_config['mezzanine']
+                ) or input_video_path
+        
+        input_args = ['-i', decode_path]
+        for index, image_path in enumerate(image_inputs, 1):
+            if index in looped_inputs:
+                input_args += animated_watermark.get_loop_input_args(image_path)
+            else:
+                input_args += ['-i', image_path]
+        filter_graph = ';'.join(filter_parts)
+        # 正式编码使用包含附加输出的滤镜图（预测只编码主输出）
+        encode_graph = ';'.join(filter_parts + side_filter_parts)
+        
+        # 输出大小预测: 用相同的滤镜图和编码参数编码几段短片段后外推
+        predict_config = global_config.get('predict', {})
+        max_size_mb = platform_config.get('max_size_mb')
+        duration = video_info.get('duration')
+        predicted_sizes = {}
+        if (predict_config.get('enabled', False) or max_size_mb) and stream_input is None and duration:
+            print("正在预测输出大小...")
+            with io_staging.mount_slot(input_video_path, 'read', io_config):
+                prediction = size_predictor.predict_job(
+                    input_args, filter_graph,
+                    [(rung_output['label'], build_video_encode_args(rung_output['target_bitrate'], codec))
+                     for rung_output in rung_outputs],
+                    duration,
+                    predict_config.get('samples', size_predictor.DEFAULT_SAMPLES),
+                    predict_config.get('sample_seconds', size_predictor.DEFAULT_SAMPLE_SECONDS)
+                )
+            if prediction:
+                audio_bitrate = video_info.get('audio_bitrate')
+                if audio_bitrate is None:
+                    audio_bitrate = size_predictor.get_audio_bitrate(input_video_path)
+                audio_bytes = int(audio_bitrate * duration / 8)
+                for rung_output, video_bytes in zip(rung_outputs, prediction['video_bytes']):
+                    predicted_size = video_bytes + audio_bytes
+                    print(f"预测大小: {os.path.basename(rung_output['path'])} 约 {predicted_size/1024/1024:.1f}MB")
+                    
+                    # 超过平台上传大小限制时按限制反推视频码率
+                    if max_size_mb and predicted_size > max_size_mb * 1024 * 1024:
+                        capped_bitrate = size_predictor.fit_bitrate_to_cap(
+                            max_size_mb * 1024 * 1024, audio_bitrate, duration
+                        )
+                        if capped_bitrate <= 0:
+                            print(f"❌ 平台大小限制 {max_size_mb}MB 过小，无法容纳该视频")
+                            return False
+                        if rung_output['target_bitrate']:
+                            capped_bitrate = min(capped_bitrate, rung_output['target_bitrate'])
+                        rung_output['target_bitrate'] = capped_bitrate
+                        predicted_size = int(max_size_mb * 1024 * 1024 * size_predictor.SIZE_CAP_MARGIN)
+                        print(f"⚠️  超过平台上限 {max_size_mb}MB，目标码率调整为 {capped_bitrate/1000:.0f}kbps")
+                    predicted_sizes[rung_output['path']] = predicted_size
+                print(f"预计编码耗时: {prediction['seconds']:.0f}秒")
+                
+                # 暂存模式下输出先写到暂存目录，再移动到输出目录: 两边的磁盘都要检查，
+                # 输出目录还要放得下尚未移动完的输出
+                needed_bytes = sum(predicted_sizes.values())
+                space_checks = [(os.path.dirname(os.path.abspath(rung_outputs[0]['path'])), needed_bytes)]
+                if batch_state is not None and batch_state.get('destination_dir'):
+                    space_checks.append(
+                        (batch_state['destination_dir'], needed_bytes + get_pending_move_bytes(batch_state))
+                    )
+                for space_dir, space_bytes in space_checks:
+                    if not size_predictor.check_free_space(
+                        space_dir, space_bytes,
+                        predict_config.get('reserve_mb', size_predictor.DEFAULT_RESERVE_MB),
+                        predict_config.get('wait_seconds', 0)
+                    ):
+                        if batch_state is not None:
+                            batch_state['disk_full'] = True
+                        return False
+            elif max_size_mb:
+                print(f"⚠️  警告: 无法预测输出大小，未按平台上限 {max_size_mb}MB 调整码率")
+        
+        print("正在添加水印...")
+        encode_started = time.time()
+        # 编码进程自身的CPU时间（隐形水印任务不计入成本模型，不统计）
+        cpu_seconds = None
+        
+        with io_staging.mount_slot(input_video_path, 'read', io_config), \
+                io_staging.mount_slot(output_video_path, 'write', io_config):
+            if use_forensic:
+                # 可见水印合成后以原始帧输出到管道，嵌入隐形水印后再编码（多档位共用一次解码，每个档位单独嵌入）
+                payload_source = (job_context or {}).get('job_id') or os.path.basename(output_video_path)
+                payload = forensic_watermark.payload_from_text(payload_source)
+                print(f"隐形水印载荷: {payload:08x}")
+            
+                decode_cmd = ['ffmpeg', '-v', 'error', '-y'] + input_args + ['-filter_complex', encode_graph]
+                forensic_rungs = []
+                for rung_output in rung_outputs:
+                    forensic_rungs.append({
+                        'label': rung_output.get('encode_label', rung_output['label']),
+                        'width': rung_output['width'],
+                        'height': rung_output['height'],
+                        'payload': payload,
+                        'encode_cmd': [
+                            'ffmpeg', '-y',
+                            '-f', 'rawvideo', '-pix_fmt', 'yuv420p',
+                            '-s', f"{rung_output['width']}x{rung_output['height']}",
+                            '-r', video_info.get('fps', '25'),
+                            '-i', '-',
+                            '-i', input_video_path,
+                            '-map', '0:v', '-map', '1:a?'
+                        ] + build_output_args(rung_output, output_format, segment_duration, codec)
+                    })
+                # 附加输出取自叠加可见水印后、嵌入隐形水印前的画面
+                side_output_args = [arg for side_output in side_output_list for arg in side_output['args']]
+            
+                result = forensic_watermark.embed_with_pipes(
+                    decode_cmd, forensic_rungs,
+                    key=forensic_config['key'],
+                    strength=forensic_config.get('strength', forensic_watermark.DEFAULT_STRENGTH),
+                    frame_interval=forensic_config.get('frame_interval', forensic_watermark.DEFAULT_FRAME_INTERVAL),
+                    extra_output_args=side_output_args
+                )
+                if result.returncode == 0:
+                    ledger_path = forensic_config.get('ledger') or os.path.join(
+                        os.path.dirname(os.path.abspath(output_video_path)), forensic_watermark.LEDGER_FILENAME
+                    )
+                    for rung_output in rung_outputs:
+                        forensic_watermark.record_payload(ledger_path, {
+                            'payload': f"{payload:08x}",
+                            'job_id': payload_source,
+                            'source': os.path.basename(source_path or input_video_path),
+                            'output': os.path.basename(rung_output['path']),
+                            'width': rung_output['width'],
+                            'height': rung_output['height']
+                        })
+            else:
+                # 构建FFmpeg命令（所有档位共用一次解码，各档位编码器并行运行）
+                ffmpeg_cmd = ['ffmpeg', '-y'] + input_args + ['-filter_complex', encode_graph]
+                for rung_output in rung_outputs:
+                    ffmpeg_cmd += ['-map', f"[{rung_output.get('encode_label', rung_output['label'])}]", '-map', '0:a?']
+                    ffmpeg_cmd += build_output_args(rung_output, output_format, segment_duration, codec)
+                for side_output in side_output_list:
+                    ffmpeg_cmd += side_output['args']
+            
+                # 运行FFmpeg命令
+                if stream_input is not None:
+                    result = run_ffmpeg_streaming(ffmpeg_cmd, *stream_input)
+                else:
+                    result, cpu_seconds = run_ffmpeg_measured(ffmpeg_cmd, timeout=3600)
+        
+        if result.returncode == 0 and stream_input is not None:
+            print("✅ 流式输出完成")
+            return True
+        
+        if result.returncode == 0:
+            encode_elapsed = time.time() - encode_started
+            input_size = os.path.getsize(input_video_path)
+            total_output_size = 0
+            for path in output_paths:
+                output_size = get_output_size(path)
+                total_output_size += output_size
+                size_ratio = output_size / input_size
+                
+                print(f"✅ 已完成: {os.path.relpath(path, os.path.dirname(os.path.abspath(output_video_path)))}")
+                print(f"文件大小: 输入 {input_size/1024/1024:.2f}MB → 输出 {output_size/1024/1024:.2f}MB")
+                print(f"大小比例: {size_ratio:.2%}")
+                if path in predicted_sizes:
+                    print(f"预测误差: {output_size / predicted_sizes[path] - 1:+.1%}")
+            print(f"编码耗时: {encode_elapsed:.1f}秒")
+            
+            side_output_list = side_outputs.collect_side_outputs(side_output_list)
+            for side_output in side_output_list:
+                print(f"附加输出: {os.path.basename(side_output['path'])}")
+            
+            # 记录编码耗时和输出大小，供编码成本模型使用（见 encode_stats.py）
+            if global_config.get('encode_stats', True) and video_info.get('duration'):
+                encode_stats.record_encode({
+                    'platform': (job_context or {}).get('platform_key', ''),
+                    'codec': codec['name'],
+                    'encoder': codec['encoder'],
+                    'preset': str(codec['preset']),
+                    'rate_control': 'bitrate' if video_bitrate else 'crf',
+                    'source_width': video_width,
+                    'source_height': video_height,
+                    'pixels': sum(rung_output['width'] * rung_output['height'] for rung_output in rung_outputs),
+                    'duration': video_info['duration'],
+                    'outputs': len(rung_outputs),
+                    'elapsed': round(encode_elapsed, 3),
+                    'cpu_seconds': round(cpu_seconds, 3) if cpu_seconds is not None else None,
+                    'cpu_scope': 'encoder',
+                    'input_bytes': input_size,
+                    'output_bytes': total_output_size,
+                    'forensic': use_forensic
+                })
+            
+            # 记录输出信息（由批处理写入输出索引，见 output_catalog.py）
+            if catalog_entries is not None:
+                settings_hash = output_catalog.get_settings_hash(platform_config, global_config)
+                for rung_output in rung_outputs:
+                    catalog_entries.append({
+                        'path': rung_output['path'],
+                        'kind': 'video',
+                        'source': os.path.abspath(source_path or input_video_path),
+                        'platform': (job_context or {}).get('platform_key', ''),
+                        'batch_id': (job_context or {}).get('batch_id'),
+                        'job_id': (job_context or {}).get('job_id'),
+                        'settings_hash': settings_hash,
+                        'size': get_output_size(rung_output['path']),
+                        'duration': video_info.get('duration'),
+                        'width': rung_output['width'],
+                        'height': rung_output['height'],
+                        'codec': codec['name']
+                    })
+                for side_output in side_output_list:
+                    catalog_entries.append({
+                        'path': side_output['path'],
+                        'kind': side_output['kind'],
+                        'source': os.path.abspath(source_path or input_video_path),
+                        'platform': (job_context or {}).get('platform_key', ''),
+                        'batch_id': (job_context or {}).get('batch_id'),
+                        'job_id': (job_context or {}).get('job_id'),
+                        'settings_hash': settings_hash,
+                        'size': os.path.getsize(side_output['path'])
+                    })
+            
+            # 记录待校验的水印位置（由批处理在线程池中校验）
+            if verify_tasks is not None:
+                for rung_output in rung_outputs:
+                    if rung_output['image_layouts']:
+                        verify_tasks.append({
+                            'output': rung_output['path'],
+                            'frame_width': rung_output['width'],
+                            'frame_height': rung_output['height'],
+                            'duration': video_info.get('duration'),
+                            'layers': rung_output['image_layouts']
+                        })
+            
+            return True
+        else:
+            print(f"❌ FFmpeg处理失败，返回码: {result.returncode}")
+            print(f"FFmpeg错误输出: {result.stderr}")
+            return False
+            
+    except subprocess.TimeoutExpired:
+        print("❌ FFmpeg处理超时")
+        return False
+    except Exception as e:
+        print(f"❌ 处理视频时出错: {str(e)}")
+        print(traceback.format_exc())
+        return False
+
+def build_output_path(output_dir, source_name, platform_key, extension, output_config, relative_dir=''):
+    """
+    输出文件路径: {来源名}_{平台}_带水印{扩展名}
+    配置了 shard_by 时写到分片子目录；输入在子文件夹中时输出保持相同的子文件夹结构
+    """
+    platform_name = PLATFORMS.get(platform_key, platform_key)
+    if output_config.get('shard_by'):
+        output_dir = output_catalog.get_shard_dir(output_dir, platform_name, source_name, output_config['shard_by'])
+    if relative_dir:
+        output_dir = os.path.join(output_dir, relative_dir)
+        os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"{source_name}_{platform_name}_带水印{extension}")
+
+def get_pending_move_bytes(batch_state):
+    """暂存模式下已提交、尚未移动到输出目录的输出总大小"""
+    return sum(size for future, size in batch_state.get('pending_moves', ()) if not future.done())
+
+def finish_staged_job(catalog_entries, verify_tasks, staging_output_dir, output_dir, catalog_path,
+                      verify_config, io_config, move_failures):
+    """
+    暂存模式下在后台完成一个任务: 先在本地校验水印、写入输出索引（校验和读取本地文件），
+    再把输出移动到输出目录中相同的相对位置；返回校验结果，移动失败时把任务记入 move_failures
+    """
+    results = []
+    for task in verify_tasks:
+        results.extend(watermark_verify.verify_output(
+            task,
+            verify_config.get('samples', watermark_verify.DEFAULT_SAMPLES),
+            verify_config.get('threshold', watermark_verify.DEFAULT_THRESHOLD)
+        ))
+    
+    if catalog_path:
+        output_catalog.record_outputs(catalog_path, staging_output_dir, catalog_entries)
+    
+    failed = False
+    for entry in catalog_entries:
+        # hls/dash 输出移动整个分片目录
+        local_path = entry['path']
+        if local_path.endswith(('.m3u8', '.mpd')):
+            local_path = os.path.dirname(local_path)
+        target_path = os.path.join(output_dir, os.path.relpath(local_path, staging_output_dir))
+        try:
+            io_staging.move_output(local_path, target_path, io_config)
+        except OSError as e:
+            print(f"❌ 移动输出 {os.path.basename(local_path)} 失败: {str(e)}")
+            failed = True
+    if failed:
+        move_failures.append(catalog_entries)
+    return results
+
+def print_batch_summary(success_count, fail_count, output_dir, not_run_count=0):
+    """打印批处理结果（not_run_count 为因磁盘空间不足没有执行的任务数）"""
+    print("\n" + "=" * 50)
+    print(f"处理完成! 成功: {success_count}, 失败: {fail_count}" +
+          (f", 未执行: {not_run_count}" if not_run_count else ""))
+    print(f"输出目录: {output_dir}")
+    print("=" * 50)
+    input("按回车键退出...")
+
+def batch_add_watermarks_ffmpeg():
+    """使用FFmpeg批量为视频添加多个平台的水印"""
+    
+    # 加载配置
+    config = load_config()
+    global_config = config['global']
+    
+    print(f"使用全局缩放比例: {global_config['size']['scale']*100}%")
+    
+    # 选择要处理的平台
+    selected_platforms = select_platforms()
+    if not selected_platforms:
+        print("没有选择任何平台，退出处理")
+        input("按回车键退出...")
+        return
+    
+    # 设置路径
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    input_dir = os.path.join(base_dir, "input_video")
+    watermarks_dir = os.path.join(base_dir, "watermarks")
+    output_dir = os.path.join(base_dir, "output_videos")
+    
+    print("=" * 50)
+    print("FFmpeg视频水印批量添加工具")
+    print("=" * 50)
+    
+    # 检查输入目录是否存在
+    if not os.path.exists(input_dir):
+        print(f"❌ 输入目录不存在: {input_dir}")
+        print("请创建 input_video 文件夹并放入视频文件")
+        input("按回车键退出...")
+        return
+    
+    # 检查水印目录是否存在
+    if not os.path.exists(watermarks_dir):
+        print(f"❌ 水印目录不存在: {watermarks_dir}")
+        print("请先运行 generate_watermarks.py 生成水印图片")
+        input("按回车键退出...")
+        return
+    
+    # 确保输出目录存在
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"已创建输出目录: {output_dir}")
+    
+    # 输入目录: input_video（包括子文件夹）和同级的 input_images，边扫描边分派任务（全局配置 "input"）
+    input_config = global_config.get('input', {})
+    scan_roots = [input_dir]
+    images_dir = os.path.join(base_dir, "input_images")
+    if os.path.exists(images_dir):
+        scan_roots.append(images_dir)
+    
+    # 输出目录分片和输出索引（全局配置 "output"）
+    output_config = global_config.get('output', {})
+    catalog_path = None
+    catalog_entries = []
+    catalog_writer = None
+    catalog_futures = []
+    if output_config.get('catalog', False):
+        catalog_path = output_config.get('catalog_path') or os.path.join(output_dir, output_catalog.CATALOG_FILENAME)
+        # 写索引要重新读取输出计算校验和，在后台线程中进行，不占用下一个任务的编码时间
+        catalog_writer = ThreadPoolExecutor(max_workers=1)
+        print(f"输出索引: {catalog_path}")
+    
+    # 批次号和任务序号（用于文字水印模板中的 {batch_id}、{job_id}）
+    batch_id = time.strftime("%Y%m%d%H%M%S")
+    job_seq = 1
+    
+    # 本地暂存（全局配置 "io" 的 scratch_dir）: 预取后续视频，输出先写到本地再在后台移动到输出目录
+    io_config = global_config.get('io', {})
+    staging_root = None
+    if io_config.get('scratch_dir'):
+        staging_root = os.path.join(io_config['scratch_dir'], f"batch_{batch_id}")
+        staging_input_dir = os.path.join(staging_root, "inputs")
+        staging_output_dir = os.path.join(staging_root, "outputs")
+        os.makedirs(staging_output_dir, exist_ok=True)
+        prefetch_depth = io_config.get('prefetch', io_staging.DEFAULT_PREFETCH)
+        prefetcher = ThreadPoolExecutor(max_workers=max(prefetch_depth, 1))
+        mover = ThreadPoolExecutor(max_workers=io_config.get('move_workers', io_staging.DEFAULT_MOVE_WORKERS))
+        finish_futures = []
+        move_failures = []
+        print(f"本地暂存目录: {staging_root}")
+    
+    if (output_config.get('shard_by') or staging_root) and 'forensic' in global_config:
+        # 分片或暂存时输出不在最终目录生成，隐形水印载荷记录统一写到输出根目录
+        global_config['forensic'] = dict(
+            {'ledger': os.path.join(output_dir, forensic_watermark.LEDGER_FILENAME)}, **global_config['forensic']
+        )
+    
+    # 各平台的水印图片和配置（每个平台只检查一次）
+    platform_jobs = {}
+    for platform_key in selected_platforms:
+        watermark_path = os.path.join(watermarks_dir, f"{platform_key}.png")
+        if not os.path.exists(watermark_path):
+            print(f"⚠️  警告: {PLATFORMS.get(platform_key, platform_key)} 的水印图片不存在")
+            continue
+        platform_jobs[platform_key] = (watermark_path, config['platforms'].get(platform_key, {
+            "position_mode": "coordinates",
+            "coordinates": {"x": 100, "y": 200},
+            "margins": {"right_margin": 50, "bottom_margin": 50}
+        }))
+    missing_platforms = len(selected_platforms) - len(platform_jobs)
+    
+    # 开启输出大小预测（或平台有上传大小限制）时，开始前先确认输出磁盘还有保留空间以外的剩余，不足时不开始处理
+    predict_config = global_config.get('predict', {})
+    if predict_config.get('enabled', False) or any(
+        platform_config.get('max_size_mb') for _, platform_config in platform_jobs.values()
+    ):
+        if not size_predictor.check_free_space(
+            output_dir, 0,
+            predict_config.get('reserve_mb', size_predictor.DEFAULT_RESERVE_MB),
+            predict_config.get('wait_seconds', 0)
+        ):
+            print("❌ 输出目录所在磁盘空间不足，不开始处理")
+            input("按回车键退出...")
+            return
+    
+    # 处理每个视频
+    success_count = 0
+    fail_count = 0
+    # 某个任务检查磁盘空间失败后停止: 后续任务不再编码预测片段，计为未执行
+    batch_state = {'disk_full': False}
+    if staging_root:
+        batch_state.update(destination_dir=output_dir, pending_moves=[])
+    not_run_count = 0
+    
+    # 图片使用与视频相同的布局规则，在线程池中用Pillow直接合成（与视频编码并行）
+    image_executor = None
+    image_futures = {}
+    
+    # 编码后的水印校验在线程池中进行，与下一个编码任务重叠
+    verify_config = global_config.get('verify', {})
+    verifier = None
+    verify_tasks = []
+    verify_futures = []
+    if verify_config.get('enabled', True) and check_numpy("水印校验", "跳过水印校验"):
+        verifier = ThreadPoolExecutor(max_workers=verify_config.get('workers', 2))
+    
+    # 第一个视频的第一个平台作为测试任务，测试失败时不再处理后续视频
+    test_passed = None
+    video_count = 0
+    image_count = 0
+    
+    inputs = input_discovery.scan_inputs(
+        scan_roots,
+        VIDEO_EXTENSIONS + image_watermark.IMAGE_EXTENSIONS,
+        include=input_config.get('include', ()),
+        exclude=input_config.get('exclude', input_discovery.DEFAULT_EXCLUDE),
+        symlinks=input_config.get('symlinks', 'files'),
+        recursive=input_config.get('recursive', True)
+    )
+    if staging_root:
+        # 只暂存视频，图片直接读取（按挂载点限制并发）；测试失败或磁盘空间不足后不再预取
+        inputs = io_staging.prefetch_inputs(
+            inputs, prefetcher, staging_input_dir, io_config, prefetch_depth,
+            should_stage=lambda item: item[0].lower().endswith(VIDEO_EXTENSIONS),
+            stop=lambda: test_passed is False or batch_state['disk_full']
+        )
+    else:
+        inputs = ((item, None) for item in inputs)
+    
+    for (input_path, relative_dir), local_input in inputs:
+        source_name, extension = os.path.splitext(os.path.basename(input_path))
+        fail_count += missing_platforms
+        
+        if extension.lower() in image_watermark.IMAGE_EXTENSIONS:
+            image_count += 1
+            if batch_state['disk_full']:
+                not_run_count += len(platform_jobs)
+                continue
+            if image_executor is None:
+                if not image_watermark.check_pillow():
+                    fail_count += len(platform_jobs)
+                    continue
+                image_executor = ThreadPoolExecutor(max_workers=global_config.get('image_workers'))
+            
+            image_jobs = []
+            for platform_key, (watermark_path, platform_config) in platform_jobs.items():
+                image_jobs.append({
+                    'input': input_path,
+                    'watermark': watermark_path,
+                    'output': build_output_path(output_dir, source_name, platform_key, extension,
+                                                output_config, relative_dir),
+                    'platform_config': platform_config,
+                    'template_vars': build_job_context(source_name, platform_key, f"{batch_id}-{job_seq:05d}", batch_id)
+                })
+                job_seq += 1
+            image_watermark.submit_image_jobs(image_executor, image_jobs, global_config, image_futures)
+            continue
+        
+        video_count += 1
+        if test_passed is False:
+            io_staging.release_input(local_input)
+            continue
+        if batch_state['disk_full']:
+            not_run_count += len(platform_jobs)
+            io_staging.release_input(local_input)
+            continue
+        
+        print(f"\n开始处理视频: {os.path.join(relative_dir, os.path.basename(input_path))}")
+        
+        # 为每个选中的平台添加水印
+        for platform_key, (watermark_path, platform_config) in platform_jobs.items():
+            if batch_state['disk_full']:
+                not_run_count += 1
+                continue
+            platform_name_chinese = PLATFORMS.get(platform_key, platform_key)
+            output_path = build_output_path(staging_output_dir if local_input else output_dir,
+                                            source_name, platform_key, '.mp4', output_config, relative_dir)
+            
+            if test_passed is None:
+                print(f"\n先进行测试: {os.path.basename(input_path)} -> {platform_key}")
+            else:
+                print(f"\n正在为 {platform_name_chinese} 添加水印...")
+            
+            success = add_watermark_with_ffmpeg(
+                input_video_path=local_input or input_path,
+                watermark_image_path=watermark_path,
+                output_video_path=output_path,
+                platform_config=platform_config,
+                global_config=global_config,
+                job_context=build_job_context(source_name, platform_key, f"{batch_id}-{job_seq:05d}", batch_id),
+                verify_tasks=verify_tasks if verifier else None,
+                catalog_entries=catalog_entries if catalog_path or local_input else None,
+                source_path=input_path if local_input else None,
+                batch_state=batch_state
+            )
+            job_seq += 1
+            if local_input:
+                # 校验、写索引和移动输出在后台进行，不占用编码时间
+                if success:
+                    finish_futures.append(mover.submit(
+                        finish_staged_job, list(catalog_entries), list(verify_tasks),
+                        staging_output_dir, output_dir, catalog_path, verify_config, io_config, move_failures
+                    ))
+                    batch_state['pending_moves'] = [
+                        (future, size) for future, size in batch_state['pending_moves'] if not future.done()
+                    ] + [(finish_futures[-1], sum(entry.get('size') or 0 for entry in catalog_entries))]
+                catalog_entries.clear()
+                verify_tasks.clear()
+            else:
+                if catalog_path:
+                    catalog_futures.append(catalog_writer.submit(
+                        output_catalog.record_outputs, catalog_path, output_dir, list(catalog_entries)
+                    ))
+                    catalog_entries.clear()
+                if verifier:
+                    watermark_verify.submit_verifications(verifier, verify_tasks, verify_futures, verify_config)
+            
+            if success:
+                success_count += 1
+            else:
+                fail_count += 1
+                if batch_state['disk_full']:
+                    print("❌ 磁盘空间不足，停止处理后续任务")
+            
+            if test_passed is None:
+                test_passed = success
+                if not success:
+                    print("❌ 测试失败，请检查FFmpeg和水印配置")
+                    break
+                print("✅ 测试成功! 继续处理所有视频...")
+        
+        io_staging.release_input(local_input)
+    
+    if not video_count and not image_count:
+        print("在 input_video 文件夹中没有找到视频或图片文件!")
+        print("支持的格式: .mp4, .mov, .avi, .mkv, .flv, .jpg, .jpeg, .png, .webp")
+    else:
+        print(f"\n共找到 {video_count} 个视频文件, {image_count} 个图片文件")
+    
+    if image_executor:
+        completed_images = []
+        image_success, image_fail = image_watermark.collect_image_results(image_futures, completed_images)
+        image_executor.shutdown()
+        success_count += image_success
+        fail_count += image_fail
+        
+        if catalog_path:
+            output_catalog.record_outputs(catalog_path, output_dir, [
+                {
+                    'path': job['output'],
+                    'kind': 'image',
+                    'source': os.path.abspath(job['input']),
+                    'platform': job['template_vars']['platform_key'],
+                    'batch_id': batch_id,
+                    'job_id': job['template_vars']['job_id'],
+                    'settings_hash': output_catalog.get_settings_hash(job['platform_config'], global_config),
+                    'size': os.path.getsize(job['output'])
+                }
+                for job in completed_images
+            ])
+    
+    if catalog_writer:
+        for future in catalog_futures:
+            future.result()
+        catalog_writer.shutdown()
+    
+    if staging_root:
+        # 等待后台移动全部完成后清理暂存目录
+        for future in finish_futures:
+            future.result()
+        prefetcher.shutdown()
+        mover.shutdown()
+        shutil.rmtree(staging_root, ignore_errors=True)
+        if move_failures:
+            print(f"❌ {len(move_failures)} 个任务的输出没有移动到输出目录")
+            success_count -= len(move_failures)
+            fail_count += len(move_failures)
+        verify_futures += finish_futures
+    
+    if verifier:
+        watermark_verify.report_verifications(verify_futures)
+        verifier.shutdown()
+    
+    save_probe_cache()
+    print_batch_summary(success_count, fail_count, output_dir, not_run_count)
+
+def format_duration(seconds):
+    """秒数格式化为 时:分:秒"""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def format_size(size):
+    """字节数格式化为 MB / GB"""
+    if size >= 1024 ** 3:
+        return f"{size / 1024 ** 3:.2f}GB"
+    return f"{size / 1024 ** 2:.1f}MB"
+
+def plan_video_job(video_info, platform_config, global_config, models):
+    """
+    估算一个视频在一个平台上的编码任务（不执行编码）
+    返回 {'codec', 'rungs', 'seconds', 'cpu_seconds', 'bytes', 'basis'}
+    """
+    video_width = video_info['width']
+    video_height = video_info['height']
+    duration = video_info['duration']
+    
+    output_format = platform_config.get('output_format', 'mp4')
+    codec = resolve_video_codec(platform_config, output_format)
+    ladder = platform_config.get('ladder')
+    if ladder:
+        rungs = get_ladder_rungs(video_width, video_height, ladder)
+    else:
+        rungs = [{'label': None, 'width': video_width, 'height': video_height}]
+    
+    pixels = sum(rung['width'] * rung['height'] for rung in rungs)
+    estimate = encode_stats.estimate_encode(
+        models, codec['name'], codec['preset'], pixels, duration, video_width, video_height
+    )
+    
+    # 输出大小: 已知原视频比特率时按目标比特率计算（与实际编码相同），否则按历史记录的每像素秒字节数
+    if codec['container'] == 'webm' and output_format == 'mp4':
+        audio_bitrate = 128000
+    else:
+        audio_bitrate = video_info.get('audio_bitrate') or 0
+    max_size_mb = platform_config.get('max_size_mb')
+    output_bytes = 0
+    for rung in rungs:
+        rung_pixels = rung['width'] * rung['height']
+        if video_info.get('bitrate'):
+            pixel_ratio = rung_pixels / (video_width * video_height)
+            target_bitrate = video_info['bitrate'] * codec['bitrate_factor'] * pixel_ratio
+            rung_bytes = (target_bitrate + audio_bitrate) * duration / 8 * size_predictor.CONTAINER_OVERHEAD
+        else:
+            rung_bytes = estimate['bytes'] * rung_pixels / pixels
+        if max_size_mb:
+            rung_bytes = min(rung_bytes, max_size_mb * 1024 * 1024 * size_predictor.SIZE_CAP_MARGIN)
+        output_bytes += rung_bytes
+    
+    # 开启输出大小预测时，预测片段的编码时间也计入
+    seconds = estimate['seconds']
+    predict_config = global_config.get('predict', {})
+    if predict_config.get('enabled', False) or max_size_mb:
+        sampled = predict_config.get('samples', size_predictor.DEFAULT_SAMPLES) * \
+            predict_config.get('sample_seconds', size_predictor.DEFAULT_SAMPLE_SECONDS)
+        seconds += estimate['seconds'] * min(sampled / duration, 1.0)
+    
+    return {
+        'codec': codec,
+        'rungs': rungs,
+        'seconds': seconds,
+        'cpu_seconds': estimate['cpu_seconds'] * seconds / estimate['seconds'] if estimate['cpu_seconds'] else None,
+        'bytes': output_bytes,
+        'basis': estimate['basis']
+    }
+
+def plan_batch(selected_platforms):
+    """
+    批处理计划（--plan）: 扫描输入并探测视频信息（使用探测缓存），构建所有任务，
+    按以往运行记录的编码速度（按编码格式/预设/分辨率，见 encode_stats.py）估算墙钟时间、
+    CPU时间、输出大小和峰值磁盘占用，打印任务计划，不执行编码
+    """
+    config = load_config()
+    global_config = config['global']
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    input_dir = os.path.join(base_dir, "input_video")
+    watermarks_dir = os.path.join(base_dir, "watermarks")
+    output_dir = os.path.join(base_dir, "output_videos")
+    if not os.path.exists(input_dir):
+        print(f"❌ 输入目录不存在: {input_dir}")
+        return False
+    
+    input_config = global_config.get('input', {})
+    scan_roots = [input_dir]
+    images_dir = os.path.join(base_dir, "input_images")
+    if os.path.exists(images_dir):
+        scan_roots.append(images_dir)
+    
+    platform_configs = {}
+    for platform_key in selected_platforms:
+        if not os.path.exists(os.path.join(watermarks_dir, f"{platform_key}.png")):
+            print(f"⚠️  警告: {PLATFORMS.get(platform_key, platform_key)} 的水印图片不存在，不计入计划")
+            continue
+        platform_configs[platform_key] = config['platforms'].get(platform_key, {})
+    
+    history = encode_stats.load_history()
+    models = encode_stats.build_models(history)
+    print(f"编码历史记录: {len(history)} 条")
+    
+    print("=" * 50)
+    print("批处理计划（不执行编码）")
+    print("=" * 50)
+    
+    # 视频任务按实际批处理的顺序依次执行；图片在线程池中与视频并行，耗时不计入墙钟时间
+    elapsed = 0.0
+    cpu_seconds = 0.0
+    cpu_measured = True
+    output_bytes = 0.0
+    video_count = 0
+    job_count = 0
+    image_count = 0
+    unknown_count = 0
+    
+    for input_path, relative_dir in input_discovery.scan_inputs(
+        scan_roots,
+        VIDEO_EXTENSIONS + image_watermark.IMAGE_EXTENSIONS,
+        include=input_config.get('include', ()),
+        exclude=input_config.get('exclude', input_discovery.DEFAULT_EXCLUDE),
+        symlinks=input_config.get('symlinks', 'files'),
+        recursive=input_config.get('recursive', True)
+    ):
+        display_name = os.path.join(relative_dir, os.path.basename(input_path))
+        if os.path.splitext(input_path)[1].lower() in image_watermark.IMAGE_EXTENSIONS:
+            image_count += 1
+            output_bytes += os.path.getsize(input_path) * len(platform_configs)
+            continue
+        
+        video_count += 1
+        video_info = get_cached_video_info(input_path)
+        if not video_info.get('duration'):
+            print(f"⚠️  警告: 无法获取 {display_name} 的时长，不计入估算")
+            unknown_count += 1
+            continue
+        
+        for platform_key, platform_config in platform_configs.items():
+            job = plan_video_job(video_info, platform_config, global_config, models)
+            job_count += 1
+            
+            sizes = '+'.join(f"{rung['width']}x{rung['height']}" for rung in job['rungs'])
+            print(f"{job_count:>4}. [{format_duration(elapsed)}] {display_name} -> "
+                  f"{PLATFORMS.get(platform_key, platform_key)}  {sizes} {job['codec']['name']}/{job['codec']['preset']}  "
+                  f"约 {format_duration(job['seconds'])}, {format_size(job['bytes'])}  ({job['basis']})")
+            
+            elapsed += job['seconds']
+            output_bytes += job['bytes']
+            if job['cpu_seconds'] is None:
+                # 没有CPU时间记录时按编码期间占满所有核心估算（上限）
+                cpu_measured = False
+                cpu_seconds += job['seconds'] * (os.cpu_count() or 1)
+            else:
+                cpu_seconds += job['cpu_seconds']
+    
+    save_probe_cache()
+    
+    # 输出在批处理过程中不断累积，峰值磁盘占用即全部输出大小
+    disk_dir = output_dir if os.path.exists(output_dir) else base_dir
+    free_bytes = shutil.disk_usage(disk_dir).free
+    reserve_bytes = global_config.get('predict', {}).get('reserve_mb', size_predictor.DEFAULT_RESERVE_MB) * 1024 * 1024
+    
+    print("\n" + "=" * 50)
+    print(f"视频 {video_count} 个, 图片 {image_count} 个, 平台 {len(platform_configs)} 个, 视频编码任务 {job_count} 个")
+    if unknown_count:
+        print(f"⚠️  {unknown_count} 个视频无法探测，未计入估算")
+    print(f"预计墙钟时间: {format_duration(elapsed)}")
+    print(f"预计CPU时间: {cpu_seconds/3600:.2f} 核时" + ("" if cpu_measured else "（部分按全部核心估算，为上限）"))
+    print(f"预计输出大小: {format_size(output_bytes)}")
+    print(f"预计峰值磁盘占用: {format_size(output_bytes)}（磁盘剩余 {format_size(free_bytes)}）")
+    if output_bytes > free_bytes - reserve_bytes:
+        print("⚠️  警告: 磁盘剩余空间不足以容纳全部输出")
+    print("=" * 50)
+    return True
+
+def stream_add_watermark(platform_key, output_format='mpegts', job_id=""):
+    """
+    流式模式: 从标准输入读取视频，加水印后以 mpegts / fmp4 写到标准输出
+    只缓冲流头部用于探测，之后边读边转发，可以直接串在下载和上传程序之间
+    （输入需要是可流式读取的格式，例如 mpegts 或 moov 前置的 mp4）
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    watermark_path = os.path.join(base_dir, "watermarks", f"{platform_key}.png")
+    
+    # 标准输出留给视频流，所有提示信息改写到标准错误
+    with redirect_stdout(sys.stderr):
+        config = load_config()
+        global_config = config['global']
+        
+        if not os.path.exists(watermark_path):
+            print(f"❌ {PLATFORMS.get(platform_key, platform_key)} 的水印图片不存在")
+            return False
+        
+        platform_config = dict(config['platforms'].get(platform_key, {
+            "position_mode": "coordinates",
+            "coordinates": {"x": 100, "y": 200},
+            "margins": {"right_margin": 50, "bottom_margin": 50}
+        }))
+        platform_config['output_format'] = output_format
+        platform_config.pop('ladder', None)
+        
+        input_stream = sys.stdin.buffer
+        head = input_stream.read(STREAM_PROBE_SIZE)
+        if not head:
+            print("❌ 标准输入没有数据")
+            return False
+        video_info = probe_stream_head(head)
+        
+        return add_watermark_with_ffmpeg(
+            input_video_path='pipe:0',
+            watermark_image_path=watermark_path,
+            output_video_path='pipe:1',
+            platform_config=platform_config,
+            global_config=global_config,
+            job_context=build_job_context("stream", platform_key, job_id),
+            video_info=video_info,
+            stream_input=(head, input_stream)
+        )
+
+def main():
+    """命令行入口: 不带参数时运行交互式批处理，--stream 时运行流式模式，--plan 时只打印批处理计划"""
+    if len(sys.argv) == 1:
+        batch_add_watermarks_ffmpeg()
+        return
+    
+    parser = argparse.ArgumentParser(description="FFmpeg视频水印工具")
+    parser.add_argument('--stream', action='store_true', help="从标准输入读取视频，加水印后写到标准输出")
+    parser.add_argument('--platform', choices=list(PLATFORMS.keys()), help="流式模式使用的平台")
+    parser.add_argument('--format', default='mpegts', choices=['mpegts', 'fmp4'], help="流式输出封装格式")
+    parser.add_argument('--job-id', default="", help="文字水印模板中的 {job_id}")
+    parser.add_argument('--plan', action='store_true', help="只估算批处理的耗时、CPU时间和磁盘占用，不执行编码")
+    parser.add_argument('--platforms', help="计划模式使用的平台，多个用逗号分隔，all 表示所有平台（默认交互选择）")
+    args = parser.parse_args()
+    
+    if args.plan:
+        if args.platforms == 'all':
+            selected_platforms = list(PLATFORMS.keys())
+        elif args.platforms:
+            selected_platforms = [key.strip() for key in args.platforms.split(',') if key.strip()]
+            unknown = [key for key in selected_platforms if key not in PLATFORMS]
+            if unknown:
+                parser.error(f"未知的平台: {', '.join(unknown)}")
+        else:
+            selected_platforms = select_platforms()
+        sys.exit(0 if plan_batch(selected_platforms) else 1)
+    
+    if args.stream:
+        if not args.platform:
+            parser.error("流式模式需要指定 --platform")
+        sys.exit(0 if stream_add_watermark(args.platform, args.format, args.job_id) else 1)
+    
+    batch_add_watermarks_ffmpeg()
+
+if __name__ == "__main__":
+    main()
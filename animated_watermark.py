@@ -0,0 +1,115 @@
+import os
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+import auto_placement
+
+# 动态水印图层（GIF / APNG / 带透明通道的短WebM）
+# 每种目标尺寸只解码、缩放一次，转成可循环的中间文件（NUT封装的无压缩 yuva420p）并缓存；
+# 每个任务只需循环读取中间文件叠加，不再逐帧解码和缩放动画，叠加开销与静态PNG基本一致
+# 图层配置: {"image": "badge.gif"}，扩展名不能区分的APNG需要写 "animated": true
+
+ANIMATED_EXTENSIONS = ('.gif', '.apng', '.webm')
+
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "animated_cache")
+
+# 中间文件像素格式（与overlay叠加到yuv420p画面时使用的格式一致，叠加时不需要再转换）
+ASSET_PIX_FMT = 'yuva420p'
+
+_asset_lock = threading.Lock()
+
+def is_animated(layer):
+    """图层是否为动态水印"""
+    if layer.get('text') or not layer.get('image'):
+        return False
+    if 'animated' in layer:
+        return bool(layer['animated'])
+    return os.path.splitext(layer['image'])[1].lower() in ANIMATED_EXTENSIONS
+
+def get_decoder_args(image_path):
+    """WebM的透明通道只有libvpx解码器能读出（FFmpeg内置的VP8/VP9解码器会丢掉）"""
+    if os.path.splitext(image_path)[1].lower() != '.webm':
+        return []
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', image_path]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    codec_name = result.stdout.strip()
+    if codec_name == 'vp9':
+        return ['-c:v', 'libvpx-vp9']
+    if codec_name == 'vp8':
+        return ['-c:v', 'libvpx']
+    return []
+
+def get_asset_path(image_path, width, height, opacity):
+    """缓存的中间文件路径（按源文件指纹 + 目标尺寸 + 不透明度）"""
+    key = f"{auto_placement.get_fingerprint(image_path)}|{width}x{height}|{opacity}"
+    return os.path.join(ASSET_CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.nut')
+
+def prepare_loop_asset(image_path, width, height, opacity=1.0):
+    """
+    生成（或复用缓存的）缩放后的循环中间文件，返回路径；失败时返回None
+    缩放规则与静态水印一致（保持宽高比且不超出目标尺寸）
+    """
+    asset_path = get_asset_path(image_path, width, height, opacity)
+    if os.path.exists(asset_path):
+        return asset_path
+
+    with _asset_lock:
+        if os.path.exists(asset_path):
+            return asset_path
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+
+        video_filter = f"scale={width}:{height}:force_original_aspect_ratio=decrease,format=rgba"
+        if opacity < 1.0:
+            video_filter += f",colorchannelmixer=aa={opacity}"
+        video_filter += f",format={ASSET_PIX_FMT}"
+
+        # 先写临时文件再改名，中断时不会留下不完整的缓存
+        fd, temp_path = tempfile.mkstemp(suffix='.nut', dir=ASSET_CACHE_DIR)
+        os.close(fd)
+        cmd = ['ffmpeg', '-v', 'error', '-y'] + get_decoder_args(image_path) + [
+            '-i', image_path, '-an', '-vf', video_filter,
+            '-c:v', 'rawvideo', '-f', 'nut', temp_path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            if result.returncode != 0:
+                print(f"❌ 动态水印预处理失败: {os.path.basename(image_path)}: {result.stderr.strip()[-300:]}")
+                return None
+            os.replace(temp_path, asset_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    print(f"已生成动态水印缓存: {os.path.basename(image_path)} ({width}x{height})")
+    return asset_path
+
+def get_loop_input_args(asset_path):
+    """循环读取中间文件的输入参数（叠加时需设置 shortest=1，随主视频结束）"""
+    return ['-stream_loop', '-1', '-i', asset_path]
+
+def get_first_frame(image_path):
+    """动画的第一帧（PNG，按源文件指纹缓存），供图片水印等只需要静态图层的场景使用"""
+    key = f"{auto_placement.get_fingerprint(image_path)}|first"
+    frame_path = os.path.join(ASSET_CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+    if os.path.exists(frame_path):
+        return frame_path
+
+    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.png', dir=ASSET_CACHE_DIR)
+    os.close(fd)
+    cmd = ['ffmpeg', '-v', 'error', '-y'] + get_decoder_args(image_path) + [
+        '-i', image_path, '-frames:v', '1', '-pix_fmt', 'rgba', temp_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            print(f"❌ 读取动态水印第一帧失败: {os.path.basename(image_path)}: {result.stderr.strip()[-300:]}")
+            return None
+        os.replace(temp_path, frame_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return frame_path
@@ -0,0 +1,252 @@
+import os
+import json
+import hashlib
+import subprocess
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from numpy_support import check_numpy
+
+# 自动水印位置（position_mode = "auto"）
+# 解码少量低分辨率帧，检测黑边、字幕区域和各角落的画面复杂度，选择最合适的角落
+# 分析结果按输入文件指纹缓存，配置改动后重跑不需要重新分析
+
+ANALYSIS_WIDTH = 320
+ANALYSIS_SAMPLES = 6
+BLOCK_SIZE = 8
+
+# 亮度低于该值的整行/整列视为黑边
+LETTERBOX_LUMA = 40
+
+# 候选角落（顺序即得分相同时的优先级）
+CANDIDATE_REGIONS = ['bottom_right', 'top_right', 'top_left', 'bottom_left']
+
+REGION_NAMES = {
+    'bottom_right': '右下角',
+    'top_right': '右上角',
+    'top_left': '左上角',
+    'bottom_left': '左下角'
+}
+
+# 与字幕区域重叠时的额外代价
+SUBTITLE_PENALTY = 10.0
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "auto_placement_cache.json")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_fingerprint(path):
+    """输入文件指纹（路径 + 大小 + 修改时间，不需要读取文件内容）"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def load_cache():
+    """读取分析结果缓存"""
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+def save_cache():
+    """保存分析结果缓存"""
+    try:
+        with open(CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(_cache, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"⚠️  警告: 保存位置分析缓存失败: {str(e)}")
+
+def decode_sample_frames(video_path, video_width, video_height, duration, samples=ANALYSIS_SAMPLES):
+    """
+    均匀取样几帧，缩小到分析宽度并以灰度原始帧读出，返回 (帧数, 高, 宽) 数组
+    duration 为视频时长（秒，取自 get_video_info，不再单独探测）
+    """
+    width = ANALYSIS_WIDTH
+    height = max(int(round(video_height * ANALYSIS_WIDTH / video_width / 2)) * 2, 2)
+    frame_size = width * height
+
+    duration = duration or 0.0
+    frames = []
+    for i in range(samples):
+        timestamp = duration * (i + 0.5) / samples
+        cmd = [
+            'ffmpeg', '-v', 'error', '-ss', f'{timestamp:.3f}', '-i', video_path,
+            '-vf', f'scale={width}:{height}', '-frames:v', '1',
+            '-f', 'rawvideo', '-pix_fmt', 'gray', '-'
+        ]
+        result = subprocess.run(cmd, capture_output=True, timeout=60)
+        if result.returncode == 0 and len(result.stdout) >= frame_size:
+            frames.append(np.frombuffer(result.stdout, dtype=np.uint8, count=frame_size).reshape(height, width))
+
+    if not frames:
+        return None
+    return np.stack(frames).astype(np.float32)
+
+def find_content_box(frames):
+    """检测上下/左右黑边，返回画面内容区域 [左, 上, 右, 下]（像素，右下不含）"""
+    _, height, width = frames.shape
+    row_dark = frames.max(axis=(0, 2)) < LETTERBOX_LUMA
+    col_dark = frames.max(axis=(0, 1)) < LETTERBOX_LUMA
+
+    rows = np.flatnonzero(~row_dark)
+    cols = np.flatnonzero(~col_dark)
+    if len(rows) < height * 0.5 or len(cols) < width * 0.5:
+        # 画面整体偏暗（夜景、淡入）时不判定黑边
+        return [0, 0, width, height]
+    return [int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1]
+
+def find_subtitle_band(frames, content_box):
+    """
+    在内容区域下部寻找硬字幕: 水平边缘密集且有高亮像素的行
+    返回 [上, 下]（像素）或 None
+    """
+    left, top, right, bottom = content_box
+    content = frames[:, top:bottom, left:right]
+    content_height = bottom - top
+
+    row_edges = np.abs(np.diff(content, axis=2)).mean(axis=(0, 2))
+    row_bright = (content > 200).mean(axis=(0, 2))
+
+    search_top = int(content_height * 0.65)
+    threshold = max(np.median(row_edges) * 2.5, 1.0)
+    candidate_rows = np.flatnonzero(
+        (row_edges[search_top:] > threshold) & (row_bright[search_top:] > 0.02)
+    ) + search_top
+
+    if len(candidate_rows) == 0:
+        return None
+    band_top, band_bottom = int(candidate_rows[0]), int(candidate_rows[-1]) + 1
+    if band_bottom - band_top > content_height * 0.25:
+        return None
+    padding = max(content_height // 50, 1)
+    return [max(band_top - padding, 0) + top, min(band_bottom + padding, content_height) + top]
+
+def build_cost_grid(frames):
+    """每个8x8块的代价: 空间复杂度（块内方差）+ 运动（块均值的帧间方差），归一化到0~1"""
+    count, height, width = frames.shape
+    block_rows, block_cols = height // BLOCK_SIZE, width // BLOCK_SIZE
+    blocks = frames[:, :block_rows * BLOCK_SIZE, :block_cols * BLOCK_SIZE]
+    blocks = blocks.reshape(count, block_rows, BLOCK_SIZE, block_cols, BLOCK_SIZE)
+
+    spatial = blocks.var(axis=(2, 4)).mean(axis=0)
+    temporal = blocks.mean(axis=(2, 4)).var(axis=0)
+    cost = spatial + temporal
+    peak = cost.max()
+    if peak > 0:
+        cost = cost / peak
+    return np.round(cost, 3)
+
+def analyze_frames(frames):
+    """分析灰度帧，返回可以JSON缓存的分析结果（坐标均为0~1的比例）"""
+    _, height, width = frames.shape
+    content_box = find_content_box(frames)
+    subtitle_band = find_subtitle_band(frames, content_box)
+
+    return {
+        'content_box': [
+            content_box[0] / width, content_box[1] / height,
+            content_box[2] / width, content_box[3] / height
+        ],
+        'subtitle_band': [subtitle_band[0] / height, subtitle_band[1] / height] if subtitle_band else None,
+        'cost_grid': build_cost_grid(frames).tolist()
+    }
+
+def analyze_video(video_path, video_width, video_height, duration, cache_key=None):
+    """
+    获取视频的位置分析结果（按输入指纹缓存）
+    duration 为视频时长（秒）；cache_key 为缓存使用的指纹，默认取 video_path 的指纹（输入暂存到本地时解码本地副本，按原文件的指纹缓存）
+    NumPy不可用或解码失败时返回None，调用方回退到相对边距
+    """
+    if not check_numpy("自动位置", "回退到相对边距"):
+        return None
+    if not video_width or not video_height:
+        return None
+
+    fingerprint = cache_key or get_fingerprint(video_path)
+    with _cache_lock:
+        cached = load_cache().get(fingerprint)
+    if cached:
+        return cached
+
+    frames = decode_sample_frames(video_path, video_width, video_height, duration)
+    if frames is None:
+        print("⚠️  警告: 自动位置分析解码失败，回退到相对边距")
+        return None
+
+    analysis = analyze_frames(frames)
+    with _cache_lock:
+        load_cache()[fingerprint] = analysis
+        save_cache()
+    return analysis
+
+def analyze_image(image):
+    """分析Pillow图片（图片批处理使用，不缓存）"""
+    if np is None:
+        return None
+    height = max(int(round(image.height * ANALYSIS_WIDTH / image.width)), 1)
+    gray = image.convert('L').resize((ANALYSIS_WIDTH, height))
+    return analyze_frames(np.asarray(gray, dtype=np.float32)[None])
+
+def region_cost(analysis, left, top, right, bottom):
+    """按比例坐标计算区域的平均代价，与字幕区域重叠时加罚"""
+    grid = analysis['cost_grid']
+    grid_rows, grid_cols = len(grid), len(grid[0]) if grid else 0
+    if not grid_rows or not grid_cols:
+        return 0.0
+
+    row_start = min(int(top * grid_rows), grid_rows - 1)
+    row_end = max(int(bottom * grid_rows + 0.999), row_start + 1)
+    col_start = min(int(left * grid_cols), grid_cols - 1)
+    col_end = max(int(right * grid_cols + 0.999), col_start + 1)
+    cells = [value for row in grid[row_start:row_end] for value in row[col_start:col_end]]
+    cost = sum(cells) / len(cells)
+
+    band = analysis.get('subtitle_band')
+    if band and top < band[1] and bottom > band[0]:
+        cost += SUBTITLE_PENALTY
+    return cost
+
+def choose_position(analysis, frame_width, frame_height, watermark_width, watermark_height,
+                    margin_ratio=0.03, avoid_regions=()):
+    """
+    在内容区域（去掉黑边）的四个角中选择代价最低的位置
+    返回 (x, y, 角落名)；avoid_regions 中的角落已被其它图层占用
+    """
+    left, top, right, bottom = analysis['content_box']
+    left, right = left * frame_width, right * frame_width
+    top, bottom = top * frame_height, bottom * frame_height
+    margin = int(min(right - left, bottom - top) * margin_ratio)
+
+    positions = {
+        'top_left': (left + margin, top + margin),
+        'top_right': (right - margin - watermark_width, top + margin),
+        'bottom_left': (left + margin, bottom - margin - watermark_height),
+        'bottom_right': (right - margin - watermark_width, bottom - margin - watermark_height)
+    }
+
+    best = None
+    for region in CANDIDATE_REGIONS:
+        if region in avoid_regions:
+            continue
+        x, y = positions[region]
+        cost = region_cost(
+            analysis,
+            x / frame_width, y / frame_height,
+            (x + watermark_width) / frame_width, (y + watermark_height) / frame_height
+        )
+        if best is None or cost < best[0]:
+            best = (cost, int(x), int(y), region)
+
+    if best is None:
+        x, y = positions['bottom_right']
+        return int(x), int(y), 'bottom_right'
+    return best[1], best[2], best[3]
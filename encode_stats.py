@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import traceback
+
+# 编码历史记录和编码成本模型
+# 每次编码成功后追加一条记录（编码器、预设、像素数、时长、耗时、输出大小），
+# 按 编码格式/预设 统计每百万像素秒的编码耗时和输出字节数，
+# 用来比较各平台改用 HEVC / AV1 / VP9 时多花的CPU时间和节省的体积
+# 批处理计划（add_watermark_ffmpeg.py --plan）按 编码格式/预设/分辨率 的历史速度估算整批任务
+
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "encode_stats.jsonl")
+
+# 对比基准（当前所有平台默认使用的编码格式）
+BASELINE_CODEC = 'h264'
+
+# 报告中换算成"1080p每分钟"的像素秒数
+REFERENCE_PIXEL_SECONDS = 1920 * 1080 * 60
+
+# 分辨率类别（按短边）
+RESOLUTION_CLASSES = [(540, '480p'), (800, '720p'), (1200, '1080p'), (1600, '1440p')]
+
+# 没有历史记录时的粗略默认值（每百万像素秒的编码秒数 / 输出字节数，按8核CPU估计）
+DEFAULT_MODELS = {
+    'h264': {'seconds_per_mps': 0.5, 'bytes_per_mps': 480000, 'cpu_per_mps': None},
+    'h265': {'seconds_per_mps': 1.2, 'bytes_per_mps': 300000, 'cpu_per_mps': None},
+    'av1': {'seconds_per_mps': 2.0, 'bytes_per_mps': 260000, 'cpu_per_mps': None},
+    'vp9': {'seconds_per_mps': 1.5, 'bytes_per_mps': 320000, 'cpu_per_mps': None}
+}
+
+def record_encode(entry, stats_path=STATS_PATH):
+    """追加一条编码记录"""
+    entry = dict(entry, time=time.strftime("%Y-%m-%d %H:%M:%S"))
+    try:
+        with open(stats_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️  警告: 保存编码记录失败: {str(e)}")
+
+def load_history(stats_path=STATS_PATH):
+    """读取编码记录列表（跳过损坏的行）"""
+    history = []
+    if not stats_path or not os.path.exists(stats_path):
+        return history
+    with open(stats_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                history.append(json.loads(line))
+            except ValueError:
+                continue
+    return history
+
+def get_pixel_seconds(entry):
+    """记录的编码工作量: 所有输出档位的像素数 × 视频时长"""
+    return entry.get('pixels', 0) * (entry.get('duration') or 0)
+
+def get_resolution_class(width, height):
+    """按短边划分的分辨率类别"""
+    short_side = min(width, height)
+    for limit, label in RESOLUTION_CLASSES:
+        if short_side <= limit:
+            return label
+    return '2160p'
+
+def get_group_key(entry, group_by):
+    """记录的分组键（group_by 中的 resolution 按原视频短边分类）"""
+    values = {
+        'codec': entry.get('codec', BASELINE_CODEC),
+        'preset': str(entry.get('preset', '')),
+        'resolution': get_resolution_class(entry.get('source_width', 0), entry.get('source_height', 0))
+    }
+    return tuple(values[name] for name in group_by)
+
+def summarize(history, platform=None, group_by=('codec', 'preset')):
+    """
+    按 group_by（codec / preset / resolution 的组合）汇总成本模型，取中位数以减少个别视频内容的影响
+    返回 {分组键: {'runs', 'seconds_per_mps', 'bytes_per_mps', 'cpu_per_mps'}}（mps = 百万像素秒）
+    隐形水印任务的耗时包含嵌入过程，不计入模型；
+    CPU时间只使用按编码进程测量的记录（cpu_scope 为 encoder，早期记录统计的是所有子进程，偏大）；
+    输出字节数只使用CRF编码的记录（rate_control 为 crf）: 按比特率编码时输出大小由原视频比特率 ×
+    bitrate_factor 决定，不反映编码格式的压缩效率；没有CRF记录时 bytes_per_mps 为None
+    """
+    groups = {}
+    for entry in history:
+        if entry.get('forensic') or entry.get('elapsed', 0) <= 0:
+            continue
+        if platform and entry.get('platform') != platform:
+            continue
+        mega_pixel_seconds = get_pixel_seconds(entry) / 1e6
+        if mega_pixel_seconds <= 0:
+            continue
+        key = get_group_key(entry, group_by)
+        group = groups.setdefault(key, {'seconds': [], 'bytes': [], 'cpu': []})
+        group['seconds'].append(entry['elapsed'] / mega_pixel_seconds)
+        if entry.get('rate_control') == 'crf':
+            group['bytes'].append(entry.get('output_bytes', 0) / mega_pixel_seconds)
+        if entry.get('cpu_seconds') and entry.get('cpu_scope') == 'encoder':
+            group['cpu'].append(entry['cpu_seconds'] / mega_pixel_seconds)
+
+    return {
+        key: {
+            'runs': len(group['seconds']),
+            'seconds_per_mps': statistics.median(group['seconds']),
+            'bytes_per_mps': statistics.median(group['bytes']) if group['bytes'] else None,
+            'cpu_per_mps': statistics.median(group['cpu']) if group['cpu'] else None
+        }
+        for key, group in groups.items()
+    }
+
+def get_codec_model(summary, codec):
+    """取某个编码格式记录最多的预设作为该格式的模型"""
+    candidates = [(model['runs'], key, model) for key, model in summary.items() if key[0] == codec]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda item: item[0])[2]
+
+def build_models(history):
+    """预先汇总三级模型（编码格式+预设+分辨率 / 编码格式+预设 / 编码格式），供批量估算使用"""
+    return {
+        'resolution': summarize(history, group_by=('codec', 'preset', 'resolution')),
+        'preset': summarize(history, group_by=('codec', 'preset')),
+        'codec': summarize(history, group_by=('codec',))
+    }
+
+def estimate_encode(models, codec, preset, pixels, duration, source_width=0, source_height=0):
+    """
+    按成本模型估算一次编码，返回 {'seconds', 'bytes', 'cpu_seconds', 'basis'}
+    依次使用同分辨率同预设、同预设、同编码格式的历史记录，都没有时使用默认值；
+    没有CRF记录时输出字节数使用该编码格式的默认值；cpu_seconds 在没有CPU时间记录时为None
+    """
+    resolution = get_resolution_class(source_width, source_height)
+    candidates = [
+        (models['resolution'].get((codec, str(preset), resolution)), f"{codec}/{preset}/{resolution}"),
+        (models['preset'].get((codec, str(preset))), f"{codec}/{preset}"),
+        (models['codec'].get((codec,)), codec)
+    ]
+    for model, label in candidates:
+        if model:
+            basis = f"{label} {model['runs']}条记录"
+            break
+    else:
+        model = DEFAULT_MODELS.get(codec, DEFAULT_MODELS[BASELINE_CODEC])
+        basis = "默认值"
+
+    mega_pixel_seconds = pixels * duration / 1e6
+    bytes_per_mps = model['bytes_per_mps'] or DEFAULT_MODELS.get(codec, DEFAULT_MODELS[BASELINE_CODEC])['bytes_per_mps']
+    return {
+        'seconds': model['seconds_per_mps'] * mega_pixel_seconds,
+        'bytes': bytes_per_mps * mega_pixel_seconds,
+        'cpu_seconds': model['cpu_per_mps'] * mega_pixel_seconds if model['cpu_per_mps'] else None,
+        'basis': basis
+    }
+
+def print_report(history, platform=None):
+    """打印成本模型: 各编码格式相对基准的耗时倍数和体积变化，以及各平台改换编码格式的预计收益"""
+    summary = summarize(history, platform)
+    if not summary:
+        print("没有可用的编码记录，请先运行批处理")
+        return
+
+    reference_mps = REFERENCE_PIXEL_SECONDS / 1e6
+    baseline = get_codec_model(summary, BASELINE_CODEC)
+
+    print("=" * 50)
+    print("编码成本模型（按1080p每分钟视频换算）")
+    print("=" * 50)
+    for (codec, preset), model in sorted(summary.items()):
+        seconds = model['seconds_per_mps'] * reference_mps
+        line = f"{codec:<5} 预设={preset:<7} 记录={model['runs']:<4} 编码耗时 {seconds:7.1f}秒"
+        if model['bytes_per_mps']:
+            line += f"  输出 {model['bytes_per_mps'] * reference_mps / 1024 / 1024:7.1f}MB"
+        else:
+            line += "  输出       -"
+        if baseline and codec != BASELINE_CODEC:
+            time_ratio = model['seconds_per_mps'] / baseline['seconds_per_mps']
+            line += f"  (相对{BASELINE_CODEC}: 耗时 ×{time_ratio:.2f}"
+            if model['bytes_per_mps'] and baseline['bytes_per_mps']:
+                line += f", 体积 {model['bytes_per_mps'] / baseline['bytes_per_mps'] - 1:+.0%}"
+            line += ")"
+        print(line)
+    print("输出体积只统计CRF编码的记录（按比特率编码时体积由原视频比特率决定，无法比较压缩效率）")
+
+    # 各平台: 按该平台实际的编码工作量，估算换成其它编码格式后的耗时和体积
+    platforms = {}
+    for entry in history:
+        if entry.get('forensic') or (platform and entry.get('platform') != platform):
+            continue
+        stats = platforms.setdefault(entry.get('platform') or '-', {
+            'mps': 0.0, 'elapsed': 0.0, 'bytes': 0, 'codecs': set()
+        })
+        stats['mps'] += get_pixel_seconds(entry) / 1e6
+        stats['elapsed'] += entry.get('elapsed', 0)
+        stats['bytes'] += entry.get('output_bytes', 0)
+        stats['codecs'].add(entry.get('codec', BASELINE_CODEC))
+
+    codecs = sorted({codec for codec, _ in summary})
+    print("\n各平台预计耗时/体积（按该平台历史编码量）")
+    for platform_key, stats in sorted(platforms.items()):
+        print(f"\n{platform_key}: 实际使用 {', '.join(sorted(stats['codecs']))}, "
+              f"耗时 {stats['elapsed']/60:.1f}分钟, 输出 {stats['bytes']/1024/1024:.1f}MB")
+        for codec in codecs:
+            model = get_codec_model(summary, codec)
+            seconds = model['seconds_per_mps'] * stats['mps']
+            line = f"  {codec:<5} 预计耗时 {seconds/60:7.1f}分钟"
+            if model['bytes_per_mps']:
+                line += f"  输出 {model['bytes_per_mps'] * stats['mps']/1024/1024:8.1f}MB"
+            else:
+                line += "  输出        -"
+            if baseline and codec != BASELINE_CODEC:
+                # 有编码进程CPU时间记录时比较CPU时间，否则只能比较墙钟耗时
+                if model['cpu_per_mps'] and baseline['cpu_per_mps']:
+                    extra_cpu = (model['cpu_per_mps'] - baseline['cpu_per_mps']) * stats['mps']
+                    changes = [f"多用CPU {extra_cpu/60:+.1f}分钟"]
+                else:
+                    extra_elapsed = seconds - baseline['seconds_per_mps'] * stats['mps']
+                    changes = [f"多用耗时 {extra_elapsed/60:+.1f}分钟（墙钟）"]
+                if model['bytes_per_mps'] and baseline['bytes_per_mps']:
+                    saved = (baseline['bytes_per_mps'] - model['bytes_per_mps']) * stats['mps']
+                    changes.append(f"节省 {saved/1024/1024:+.1f}MB")
+                line += f"  ({', '.join(changes)})"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="编码成本模型报告")
+    parser.add_argument('--stats', default=STATS_PATH, help="编码记录文件 (encode_stats.jsonl)")
+    parser.add_argument('--platform', help="只统计某个平台")
+    args = parser.parse_args()
+
+    try:
+        print_report(load_history(args.stats), args.platform)
+    except Exception as e:
+        print(f"❌ 生成报告时出错: {str(e)}")
+        print(traceback.format_exc())
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
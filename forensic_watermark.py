@@ -0,0 +1,391 @@
+import os
+import sys
+import json
+import zlib
+import hashlib
+import argparse
+import subprocess
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from numpy_support import check_numpy
+
+# 隐形水印（取证水印）
+# 在亮度通道8x8块DCT的中频系数中嵌入扩频载荷: 8位同步头 + 32位载荷编号
+# 每个系数位置由密钥生成的±1码片调制，检测时按比特累加相关值
+# 已知限制: 码片由密钥和画面尺寸生成，且按左上角对齐的8x8网格排列；检测只尝试原尺寸和
+# 记录文件中的嵌入尺寸（整体缩放可以恢复），不搜索块偏移和裁剪尺寸，被裁剪过的画面检测不到
+
+BLOCK_SIZE = 8
+
+# 嵌入载荷的中频系数位置（避开直流和容易被压缩掉的高频）
+MID_FREQ_POSITIONS = [
+    (1, 2), (2, 1), (2, 2), (1, 3), (3, 1), (2, 3),
+    (3, 2), (1, 4), (4, 1), (3, 3), (2, 4), (4, 2)
+]
+
+SYNC_BITS = [1, 0, 1, 0, 0, 1, 0, 1]
+PAYLOAD_BITS = 32
+TOTAL_BITS = len(SYNC_BITS) + PAYLOAD_BITS
+
+DEFAULT_STRENGTH = 3.0
+DEFAULT_FRAME_INTERVAL = 1
+
+# 同步头平均相关值超过该阈值才认为检测到水印
+DETECT_THRESHOLD = 4.0
+
+# 载荷编号与任务的对应记录（与输出视频放在同一目录）
+LEDGER_FILENAME = "forensic_payloads.jsonl"
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.flv', '.ts', '.webm')
+
+def payload_from_text(text):
+    """根据任务ID等文本生成32位载荷编号"""
+    return zlib.crc32(str(text).encode('utf-8')) & 0xFFFFFFFF
+
+def payload_to_bits(payload):
+    """载荷编号转换为同步头 + 载荷比特"""
+    return SYNC_BITS + [(payload >> (PAYLOAD_BITS - 1 - i)) & 1 for i in range(PAYLOAD_BITS)]
+
+def bits_to_payload(bits):
+    """载荷比特还原为载荷编号"""
+    payload = 0
+    for bit in bits:
+        payload = (payload << 1) | int(bit)
+    return payload
+
+@lru_cache(maxsize=None)
+def dct_matrix(size=BLOCK_SIZE):
+    """正交DCT-II变换矩阵"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] *= np.sqrt(1 / size)
+    matrix[1:] *= np.sqrt(2 / size)
+    return matrix.astype(np.float32)
+
+@lru_cache(maxsize=16)
+def spread_pattern(width, height, key):
+    """
+    生成扩频码片和比特分配，形状为 (块行, 块列, 中频系数)
+    只由密钥和画面尺寸决定，嵌入端和检测端各自生成一次后缓存
+    """
+    seed = int.from_bytes(hashlib.sha256(f"{key}:{width}x{height}".encode('utf-8')).digest()[:8], 'big')
+    rng = np.random.default_rng(seed)
+    shape = (height // BLOCK_SIZE, width // BLOCK_SIZE, len(MID_FREQ_POSITIONS))
+    chips = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=shape)
+    bit_map = rng.integers(0, TOTAL_BITS, size=shape)
+    return chips, bit_map
+
+def build_embed_pattern(width, height, key, payload, strength=DEFAULT_STRENGTH):
+    """
+    预先计算空域叠加图样（对DCT域的调制做一次逆变换）
+    DCT是线性变换，所以每帧嵌入只需要把图样加到亮度平面上
+    """
+    chips, bit_map = spread_pattern(width, height, key)
+    bit_signs = np.where(np.array(payload_to_bits(payload)) == 1, 1.0, -1.0).astype(np.float32)
+
+    block_rows, block_cols = chips.shape[:2]
+    rows, cols = zip(*MID_FREQ_POSITIONS)
+    coefficients = np.zeros((block_rows, block_cols, BLOCK_SIZE, BLOCK_SIZE), dtype=np.float32)
+    coefficients[:, :, rows, cols] = strength * chips * bit_signs[bit_map]
+
+    # 逆DCT: B = D^T · C · D
+    dct = dct_matrix()
+    blocks = dct.T @ coefficients @ dct
+
+    pattern = np.zeros((height, width), dtype=np.float32)
+    pattern[:block_rows * BLOCK_SIZE, :block_cols * BLOCK_SIZE] = (
+        blocks.transpose(0, 2, 1, 3).reshape(block_rows * BLOCK_SIZE, block_cols * BLOCK_SIZE)
+    )
+    return pattern
+
+def embed_frame(y_plane, pattern, work):
+    """把图样叠加到亮度平面（原地修改，work 为预分配的浮点缓冲区）"""
+    np.add(y_plane, pattern, out=work)
+    np.rint(work, out=work)
+    np.clip(work, 0, 255, out=work)
+    y_plane[...] = work
+
+def measure_frame(y_plane, key):
+    """计算单帧每个比特的归一化相关值"""
+    height, width = y_plane.shape
+    chips, bit_map = spread_pattern(width, height, key)
+    block_rows, block_cols = chips.shape[:2]
+
+    blocks = y_plane[:block_rows * BLOCK_SIZE, :block_cols * BLOCK_SIZE].astype(np.float32)
+    blocks = blocks.reshape(block_rows, BLOCK_SIZE, block_cols, BLOCK_SIZE).transpose(0, 2, 1, 3)
+
+    # 正向DCT: C = D · B · D^T
+    dct = dct_matrix()
+    rows, cols = zip(*MID_FREQ_POSITIONS)
+    coefficients = (dct @ blocks @ dct.T)[:, :, rows, cols]
+
+    flat_bits = bit_map.ravel()
+    correlation = np.bincount(flat_bits, weights=(coefficients * chips).ravel(), minlength=TOTAL_BITS)
+    energy = np.bincount(flat_bits, weights=(coefficients ** 2).ravel(), minlength=TOTAL_BITS)
+    return correlation / np.sqrt(np.maximum(energy, 1e-6))
+
+def decode_scores(frame_scores):
+    """汇总多帧的相关值，返回 (同步头得分, 载荷编号)"""
+    combined = np.sum(frame_scores, axis=0) / np.sqrt(len(frame_scores))
+    sync_signs = np.where(np.array(SYNC_BITS) == 1, 1.0, -1.0)
+    sync_score = float(np.mean(combined[:len(SYNC_BITS)] * sync_signs))
+    payload = bits_to_payload(combined[len(SYNC_BITS):] > 0)
+    return sync_score, payload
+
+def yuv420p_frame_size(width, height):
+    """yuv420p原始帧的字节数"""
+    chroma_width = (width + 1) // 2
+    chroma_height = (height + 1) // 2
+    return width * height + 2 * chroma_width * chroma_height
+
+def read_frame(stream, buffer):
+    """从管道读取一整帧到预分配缓冲区，流结束时返回False"""
+    view = memoryview(buffer)
+    total = 0
+    while total < len(buffer):
+        count = stream.readinto(view[total:])
+        if not count:
+            return False
+        total += count
+    return True
+
+def pump_frames(stream, encoder, width, height, pattern, frame_interval):
+    """
+    从一路原始帧管道逐帧读取，在抽样帧的亮度平面嵌入载荷后写入编码进程，返回帧数
+    帧缓冲区只分配一次，NumPy直接在缓冲区上操作
+    """
+    buffer = bytearray(yuv420p_frame_size(width, height))
+    y_plane = np.frombuffer(buffer, dtype=np.uint8, count=width * height).reshape(height, width)
+    work = np.empty((height, width), dtype=np.float32)
+
+    frame_index = 0
+    try:
+        while read_frame(stream, buffer):
+            if frame_index % frame_interval == 0:
+                embed_frame(y_plane, pattern, work)
+            encoder.stdin.write(buffer)
+            frame_index += 1
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        # 关闭读端: 编码进程提前退出时解码进程写入失败后结束，不会一直阻塞
+        stream.close()
+    return frame_index
+
+def embed_with_pipes(decode_cmd, rungs, key, strength=DEFAULT_STRENGTH,
+                     frame_interval=DEFAULT_FRAME_INTERVAL, extra_output_args=()):
+    """
+    解码进程输出yuv420p原始帧 → 在抽样帧的亮度平面嵌入载荷 → 写入编码进程
+    decode_cmd 为解码命令（输入和滤镜图，不含输出）；rungs 为每个档位的
+    {'label', 'width', 'height', 'payload', 'encode_cmd'}，extra_output_args 为解码进程的其它输出（附加输出）
+    多个档位共用一次解码: 第一个档位写到标准输出，其余档位写到单独的管道（pipe:fd，Windows不支持），
+    每个档位在各自的线程中嵌入（扩频码按档位尺寸生成）并写入各自的编码进程；返回值与subprocess.run一致
+    """
+    encode_cmd = rungs[0]['encode_cmd']
+    if not check_numpy("隐形水印"):
+        return subprocess.CompletedProcess(encode_cmd, 1, '', 'NumPy未安装')
+    if not key:
+        return subprocess.CompletedProcess(encode_cmd, 1, '', '隐形水印密钥为空')
+    if len(rungs) > 1 and os.name == 'nt':
+        return subprocess.CompletedProcess(encode_cmd, 1, '', 'Windows不支持多档位隐形水印')
+
+    patterns = [
+        build_embed_pattern(rung['width'], rung['height'], key, rung['payload'], strength) for rung in rungs
+    ]
+
+    pipes = [os.pipe() for _ in rungs[1:]]
+    targets = ['-'] + [f"pipe:{write_fd}" for _, write_fd in pipes]
+    cmd = list(decode_cmd)
+    for rung, target in zip(rungs, targets):
+        cmd += ['-map', f"[{rung['label']}]", '-f', 'rawvideo', '-pix_fmt', 'yuv420p', target]
+    cmd += list(extra_output_args)
+
+    with ExitStack() as stack:
+        decode_log = stack.enter_context(tempfile.TemporaryFile())
+        encode_logs = [stack.enter_context(tempfile.TemporaryFile()) for _ in rungs]
+        try:
+            decoder = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=decode_log,
+                                       pass_fds=[write_fd for _, write_fd in pipes])
+        finally:
+            # 写端只留给解码进程，解码结束时各档位的读端才能读到EOF
+            for _, write_fd in pipes:
+                os.close(write_fd)
+        streams = [decoder.stdout] + [os.fdopen(read_fd, 'rb') for read_fd, _ in pipes]
+        encoders = [
+            subprocess.Popen(rung['encode_cmd'], stdin=subprocess.PIPE, stderr=encode_log)
+            for rung, encode_log in zip(rungs, encode_logs)
+        ]
+
+        with ThreadPoolExecutor(max_workers=len(rungs)) as executor:
+            futures = [
+                executor.submit(pump_frames, stream, encoder, rung['width'], rung['height'], pattern, frame_interval)
+                for stream, encoder, rung, pattern in zip(streams, encoders, rungs, patterns)
+            ]
+            frame_counts = [future.result() for future in futures]
+
+        decoder_returncode = decoder.wait()
+        encoder_returncodes = [encoder.wait() for encoder in encoders]
+        failed_returncode = decoder_returncode or next((code for code in encoder_returncodes if code), 0)
+        if failed_returncode:
+            stderr = b''
+            for log in [decode_log] + encode_logs:
+                log.seek(0)
+                stderr += log.read()
+            return subprocess.CompletedProcess(encode_cmd, failed_returncode, '', stderr.decode('utf-8', errors='replace'))
+
+    for rung, frame_count in zip(rungs, frame_counts):
+        print(f"隐形水印已嵌入 {rung['width']}x{rung['height']}: "
+              f"{(frame_count + frame_interval - 1) // frame_interval}/{frame_count} 帧")
+    return subprocess.CompletedProcess(encode_cmd, 0, '', '')
+
+def record_payload(ledger_path, entry):
+    """追加一条载荷编号记录"""
+    with open(ledger_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def load_ledger(ledger_path):
+    """读取载荷编号记录，返回 {载荷编号: [记录...]}"""
+    ledger = {}
+    if not ledger_path or not os.path.exists(ledger_path):
+        return ledger
+    with open(ledger_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            ledger.setdefault(entry['payload'], []).append(entry)
+    return ledger
+
+def probe_frame_size(video_path):
+    """获取视频画面尺寸"""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height', '-of', 'csv=p=0', video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    if result.returncode == 0 and result.stdout.strip():
+        parts = result.stdout.strip().split(',')
+        if len(parts) >= 2:
+            return int(parts[0]), int(parts[1])
+    return None
+
+def detect_file(video_path, key, candidate_sizes=(), max_frames=30):
+    """
+    检测单个可疑文件: 只解码关键帧并取亮度，依次尝试原尺寸和候选嵌入尺寸
+    只处理整体缩放，不处理裁剪（见文件开头的已知限制）；返回检测结果字典
+    """
+    best = {'file': video_path, 'detected': False, 'score': 0.0, 'payload': None, 'size': None}
+    try:
+        sizes = []
+        native_size = probe_frame_size(video_path)
+        if native_size:
+            sizes.append(native_size)
+        sizes += [tuple(size) for size in candidate_sizes if tuple(size) not in sizes]
+
+        for width, height in sizes:
+            cmd = ['ffmpeg', '-v', 'error', '-skip_frame', 'nokey', '-i', video_path]
+            if (width, height) != native_size:
+                cmd += ['-vf', f'scale={width}:{height}']
+            cmd += ['-frames:v', str(max_frames), '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+
+            result = subprocess.run(cmd, capture_output=True, timeout=600)
+            frame_size = width * height
+            frame_count = len(result.stdout) // frame_size
+            if result.returncode != 0 or frame_count == 0:
+                continue
+
+            frames = np.frombuffer(result.stdout, dtype=np.uint8, count=frame_count * frame_size)
+            frames = frames.reshape(frame_count, height, width)
+            scores = [measure_frame(frame, key) for frame in frames]
+            sync_score, payload = decode_scores(scores)
+
+            if sync_score > best['score']:
+                best.update({
+                    'detected': sync_score >= DETECT_THRESHOLD,
+                    'score': sync_score,
+                    'payload': f"{payload:08x}",
+                    'size': f"{width}x{height}"
+                })
+    except Exception as e:
+        best['error'] = str(e)
+
+    return best
+
+def detect_directory(suspect_dir, key, ledger_path=None, workers=None, max_frames=30):
+    """用进程池批量检测目录（含子目录）中的可疑文件"""
+    if not check_numpy("隐形水印"):
+        return []
+
+    ledger = load_ledger(ledger_path)
+    candidate_sizes = sorted({
+        (entry['width'], entry['height'])
+        for entries in ledger.values() for entry in entries
+        if entry.get('width') and entry.get('height')
+    })
+
+    video_files = []
+    for root, _, files in os.walk(suspect_dir):
+        for name in files:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                video_files.append(os.path.join(root, name))
+
+    print(f"找到 {len(video_files)} 个待检测文件")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(detect_file, path, key, candidate_sizes, max_frames)
+            for path in video_files
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            matches = ledger.get(result['payload'], []) if result['detected'] else []
+            result['matches'] = matches
+            results.append(result)
+
+            name = os.path.relpath(result['file'], suspect_dir)
+            if result.get('error'):
+                print(f"❌ {name}: 检测出错 {result['error']}")
+            elif result['detected']:
+                print(f"✅ {name}: 检测到水印 载荷={result['payload']} 得分={result['score']:.1f}")
+                for entry in matches:
+                    print(f"    来源: {entry.get('job_id')} {entry.get('output')}")
+            else:
+                print(f"   {name}: 未检测到水印 (得分={result['score']:.1f})")
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="隐形水印批量检测工具")
+    parser.add_argument('suspect_dir', help="可疑文件所在目录")
+    parser.add_argument('--key', required=True, help="嵌入时使用的密钥")
+    parser.add_argument('--ledger', help=f"载荷编号记录文件 ({LEDGER_FILENAME})")
+    parser.add_argument('--workers', type=int, default=None, help="并行进程数")
+    parser.add_argument('--max-frames', type=int, default=30, help="每个文件最多解码的关键帧数")
+    args = parser.parse_args()
+
+    try:
+        results = detect_directory(args.suspect_dir, args.key, args.ledger, args.workers, args.max_frames)
+        detected = sum(1 for result in results if result['detected'])
+        print(f"\n检测完成: {detected}/{len(results)} 个文件含有水印")
+    except Exception as e:
+        print(f"❌ 检测时出错: {str(e)}")
+        print(traceback.format_exc())
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
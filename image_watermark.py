@@ -0,0 +1,181 @@
+import os
+import traceback
+from concurrent.futures import as_completed
+from functools import lru_cache
+
+try:
+    from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageOps
+except ImportError:
+    Image = None
+
+import animated_watermark
+import auto_placement
+import io_staging
+from watermark_layout import get_layout_plan, get_watermark_layers, get_text_anchor, get_font_size
+from watermark_text import render_text_template, merge_template_vars, resolve_font_file
+
+# 图片（封面、海报）批量加水印
+# 与视频使用同一套布局计算，直接用Pillow在进程内合成，不为每张图片启动FFmpeg
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def check_pillow():
+    """检查Pillow是否可用"""
+    if Image is None:
+        print("❌ 图片水印需要Pillow，请先安装: pip install pillow")
+        return False
+    return True
+
+@lru_cache(maxsize=256)
+def load_scaled_watermark(image_path, width, height, opacity):
+    """读取并缩放水印图片（按目标尺寸缓存，同尺寸的图片只缩放一次）"""
+    with Image.open(image_path) as watermark:
+        watermark = watermark.convert('RGBA')
+    # 与FFmpeg的 force_original_aspect_ratio=decrease 一致：保持宽高比且不超出目标尺寸
+    ratio = min(width / watermark.width, height / watermark.height)
+    scaled_size = (max(int(watermark.width * ratio), 1), max(int(watermark.height * ratio), 1))
+    if scaled_size != watermark.size:
+        watermark = watermark.resize(scaled_size, Image.LANCZOS)
+    if opacity < 1.0:
+        alpha = watermark.getchannel('A').point(lambda value: int(value * opacity))
+        watermark.putalpha(alpha)
+    return watermark
+
+@lru_cache(maxsize=64)
+def load_font(font, font_size):
+    """读取字体（按字体和字号缓存）"""
+    font_file = resolve_font_file(font)
+    if font_file:
+        return ImageFont.truetype(font_file, font_size)
+    try:
+        return ImageFont.load_default(size=font_size)
+    except TypeError:
+        # Pillow 10.1 之前的默认字体不支持字号
+        return ImageFont.load_default()
+
+def paste_layer(base, layer_image, x, y):
+    """把图层叠加到底图上（超出左上边界的部分裁掉）"""
+    base.alpha_composite(layer_image, dest=(max(x, 0), max(y, 0)), source=(max(-x, 0), max(-y, 0)))
+
+def draw_text_layer(base, layer, image_width, image_height, global_config, analysis=None, used_regions=None):
+    """绘制文字图层（贴近右/下边缘时以右下角对齐，与视频的drawtext一致）"""
+    font_size = get_font_size(layer, global_config, image_width, image_height)
+    font = load_font(layer.get('font'), font_size)
+
+    overlay = Image.new('RGBA', base.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    left, top, right, bottom = draw.textbbox((0, 0), layer['text'], font=font)
+    text_width, text_height = right - left, bottom - top
+
+    layout = get_layout_plan(
+        image_width, image_height, text_width, text_height,
+        layer, global_config, verbose=False,
+        analysis=analysis, avoid_regions=used_regions or ()
+    )
+    anchor_right, anchor_bottom = get_text_anchor(layer, layout)
+    x = layout['x'] + layout['width'] - text_width if anchor_right else layout['x']
+    y = layout['y'] + layout['height'] - text_height if anchor_bottom else layout['y']
+
+    color = ImageColor.getrgb(layer.get('font_color', 'white'))[:3]
+    alpha = int(255 * layer.get('opacity', 1.0))
+    draw.text((x - left, y - top), layer['text'], font=font, fill=color + (alpha,))
+    base.alpha_composite(overlay)
+    return layout
+
+def add_watermark_to_image(input_image_path, watermark_image_path, output_image_path,
+                           platform_config, global_config, template_vars=None):
+    """为单张图片添加水印（与视频相同的图层、位置和缩放规则）"""
+    # 读写原图和输出时按挂载点限制并发（全局配置 "io"，见 io_staging.py）
+    io_config = global_config.get('io', {})
+    try:
+        with io_staging.mount_slot(input_image_path, 'read', io_config), Image.open(input_image_path) as source:
+            source = ImageOps.exif_transpose(source)
+            icc_profile = source.info.get('icc_profile')
+            base = source.convert('RGBA')
+
+        image_width, image_height = base.size
+        layers = get_watermark_layers(platform_config, watermark_image_path)
+        # 模板变量: 全局 < 平台 < 任务（与视频相同）
+        template_vars = merge_template_vars(input_image_path, global_config, platform_config, template_vars)
+        
+        # 自动位置直接分析当前图片
+        analysis = None
+        if any(layer.get('position_mode') == 'auto' for layer in layers):
+            analysis = auto_placement.analyze_image(base)
+        used_regions = []
+        
+        for layer in layers:
+            if layer.get('text'):
+                layer['text'] = render_text_template(layer['text'], template_vars)
+                layout = draw_text_layer(base, layer, image_width, image_height, global_config,
+                                         analysis, used_regions)
+                if layout['region']:
+                    used_regions.append(layout['region'])
+                continue
+
+            if animated_watermark.is_animated(layer):
+                # 图片只叠加动态水印的第一帧
+                layer['image'] = animated_watermark.get_first_frame(layer['image'])
+                if layer['image'] is None:
+                    continue
+
+            with Image.open(layer['image']) as watermark:
+                watermark_width, watermark_height = watermark.size
+            layout = get_layout_plan(
+                image_width, image_height, watermark_width, watermark_height,
+                layer, global_config, verbose=False,
+                analysis=analysis, avoid_regions=used_regions
+            )
+            if layout['region']:
+                used_regions.append(layout['region'])
+            if layout['width'] <= 0 or layout['height'] <= 0:
+                continue
+            scaled = load_scaled_watermark(
+                layer['image'], layout['width'], layout['height'], layer.get('opacity', 1.0)
+            )
+            paste_layer(base, scaled, layout['x'], layout['y'])
+
+        save_options = {}
+        if icc_profile:
+            save_options['icc_profile'] = icc_profile
+        extension = os.path.splitext(output_image_path)[1].lower()
+        if extension in ('.jpg', '.jpeg'):
+            base = base.convert('RGB')
+            save_options.update(quality=95, subsampling=0)
+        elif extension == '.webp':
+            save_options.update(quality=95)
+        with io_staging.mount_slot(output_image_path, 'write', io_config):
+            base.save(output_image_path, **save_options)
+        return True
+
+    except Exception as e:
+        print(f"❌ 处理图片 {os.path.basename(input_image_path)} 时出错: {str(e)}")
+        print(traceback.format_exc())
+        return False
+
+def submit_image_jobs(executor, jobs, global_config, futures):
+    """
+    把图片任务提交到线程池（批处理扫描到图片就立即提交）
+    每个任务包含 input / watermark / output / platform_config / template_vars；futures 为 {future: 任务}
+    """
+    for job in jobs:
+        future = executor.submit(
+            add_watermark_to_image, job['input'], job['watermark'], job['output'],
+            job['platform_config'], global_config, job.get('template_vars')
+        )
+        futures[future] = job
+
+def collect_image_results(futures, completed=None):
+    """等待图片任务完成，传入 completed 列表时把成功的任务追加进去；返回 (成功数, 失败数)"""
+    success_count = 0
+    fail_count = 0
+    for future in as_completed(futures):
+        if future.result():
+            success_count += 1
+            if completed is not None:
+                completed.append(futures[future])
+        else:
+            fail_count += 1
+
+    print(f"图片处理完成: 成功 {success_count}, 失败 {fail_count}")
+    return success_count, fail_count
@@ -0,0 +1,74 @@
+import os
+import fnmatch
+
+# 输入文件发现
+# 用 os.scandir 递归扫描输入目录，每读完一个目录就把其中的文件交给批处理，不需要先列出整个目录树；
+# 在NFS上有大量文件时第一个编码任务也能马上开始。目录条目先读入列表再逐个生成，
+# 编码期间不会一直占用打开的目录句柄，读取过程中的错误（例如NFS的ESTALE）只跳过该目录
+# 全局配置 "input": {"recursive": true, "include": [], "exclude": [".*"], "symlinks": "files"}
+
+DEFAULT_EXCLUDE = ('.*',)
+
+# 符号链接处理方式
+# skip: 忽略所有符号链接；files: 包含指向文件的链接，不进入指向目录的链接；follow: 都跟随（防止循环）
+SYMLINK_POLICIES = ('skip', 'files', 'follow')
+
+def matches_any(name, relative_path, patterns):
+    """文件名或相对路径匹配任意一个通配符"""
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern) for pattern in patterns)
+
+def scan_inputs(roots, extensions, include=(), exclude=DEFAULT_EXCLUDE, symlinks='files', recursive=True):
+    """
+    扫描输入目录，逐个生成 (文件路径, 相对输入目录的子目录)
+    extensions 为小写扩展名；include 非空时只保留匹配的文件，exclude 匹配的文件和目录（整个子树）被跳过
+    通配符同时匹配名称和相对路径（以 / 分隔），例如 "*.mp4"、"raw/*"、".*"
+    """
+    if symlinks not in SYMLINK_POLICIES:
+        print(f"⚠️  警告: 未知的符号链接处理方式 {symlinks}，使用 files")
+        symlinks = 'files'
+    extensions = tuple(extension.lower() for extension in extensions)
+
+    for root in roots:
+        visited = set()
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                # 按 (设备, inode) 记录已扫描的目录，跟随符号链接时不会陷入循环
+                stat = os.stat(directory)
+                if (stat.st_dev, stat.st_ino) in visited:
+                    continue
+                visited.add((stat.st_dev, stat.st_ino))
+                with os.scandir(directory) as iterator:
+                    entries = list(iterator)
+            except OSError as e:
+                print(f"⚠️  警告: 无法读取目录 {directory}: {str(e)}")
+                continue
+
+            relative_dir = os.path.relpath(directory, root)
+            relative_dir = '' if relative_dir == os.curdir else relative_dir
+            subdirs = []
+            for entry in entries:
+                try:
+                    is_symlink = entry.is_symlink()
+                    if is_symlink and symlinks == 'skip':
+                        continue
+                    relative_path = os.path.join(relative_dir, entry.name).replace(os.sep, '/')
+                    if matches_any(entry.name, relative_path, exclude):
+                        continue
+
+                    if entry.is_dir():
+                        if recursive and (not is_symlink or symlinks == 'follow'):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file() or not entry.name.lower().endswith(extensions):
+                        continue
+                    if include and not matches_any(entry.name, relative_path, include):
+                        continue
+                except OSError:
+                    # 扫描过程中被删除或无权限的条目
+                    continue
+                yield entry.path, relative_dir
+
+            # 子目录按目录内顺序依次扫描（深度优先）
+            pending.extend(reversed(subdirs))
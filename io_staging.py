@@ -0,0 +1,150 @@
+import os
+import shutil
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# 输入输出暂存和按挂载点限制并发读写
+# 输入、输出目录在NFS上时，多个任务同时读写同一个共享会使吞吐量骤降：
+# 配置 scratch_dir 后，输入在前一个视频编码时预先复制到本地暂存目录，输出先写到本地，再在后台移动到输出目录；
+# 所有复制、移动和图片读写按挂载点限制同时进行的读/写数量
+# 全局配置 "io": {
+#     "scratch_dir": "/dev/shm/shuiyin", "prefetch": 2, "move_workers": 2,
+#     "reads_per_mount": 2, "writes_per_mount": 2,
+#     "mounts": {"/mnt/nfs": {"reads": 1, "writes": 1}}
+# }（未配置 "io" 时不限制并发，也不暂存）
+
+DEFAULT_READS_PER_MOUNT = 2
+DEFAULT_WRITES_PER_MOUNT = 2
+
+# 预取的输入个数（正在编码的之外）
+DEFAULT_PREFETCH = 2
+
+DEFAULT_MOVE_WORKERS = 2
+
+# 复制过程中的临时文件后缀（复制完成后改名，下游程序不会读到不完整的文件）
+PARTIAL_SUFFIX = '.part'
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+def get_mount_point(path):
+    """路径所在的挂载点（路径还不存在时按最近的已存在上级目录计算）"""
+    path = os.path.realpath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+def get_mount_limit(mount, kind, io_config):
+    """挂载点允许同时进行的读（kind='read'）或写（kind='write'）数量"""
+    defaults = {'read': DEFAULT_READS_PER_MOUNT, 'write': DEFAULT_WRITES_PER_MOUNT}
+    limit = io_config.get(f'{kind}s_per_mount', defaults[kind])
+    limit = io_config.get('mounts', {}).get(mount, {}).get(f'{kind}s', limit)
+    return max(int(limit), 1)
+
+@contextmanager
+def mount_slot(path, kind, io_config):
+    """
+    占用路径所在挂载点的一个读/写名额，名额用完时等待（未配置 "io" 时不限制）
+    同时需要读和写时总是先占读名额再占写名额，不会互相等待形成死锁
+    """
+    if not io_config:
+        yield
+        return
+    mount = get_mount_point(path)
+    with _semaphores_lock:
+        semaphore = _semaphores.get((mount, kind))
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(get_mount_limit(mount, kind, io_config))
+            _semaphores[(mount, kind)] = semaphore
+    with semaphore:
+        yield
+
+def copy_file(source_path, target_path, io_config):
+    """按挂载点限制复制文件（先写临时文件再改名）"""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    partial_path = target_path + PARTIAL_SUFFIX
+    with mount_slot(source_path, 'read', io_config), mount_slot(target_path, 'write', io_config):
+        shutil.copyfile(source_path, partial_path)
+    os.replace(partial_path, target_path)
+
+def move_output(local_path, target_path, io_config):
+    """
+    把暂存目录中的输出（文件或 hls/dash 目录）移动到输出目录
+    同一文件系统内直接改名；跨文件系统时复制到临时名称后改名，再删除本地文件
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    try:
+        if os.path.isdir(target_path):
+            shutil.rmtree(target_path)
+        os.replace(local_path, target_path)
+        return
+    except OSError:
+        pass
+
+    partial_path = target_path + PARTIAL_SUFFIX
+    with mount_slot(local_path, 'read', io_config), mount_slot(target_path, 'write', io_config):
+        if os.path.isdir(local_path):
+            shutil.rmtree(partial_path, ignore_errors=True)
+            shutil.copytree(local_path, partial_path)
+        else:
+            shutil.copyfile(local_path, partial_path)
+    if os.path.isdir(target_path):
+        shutil.rmtree(target_path)
+    os.replace(partial_path, target_path)
+    if os.path.isdir(local_path):
+        shutil.rmtree(local_path)
+    else:
+        os.remove(local_path)
+
+def stage_input(input_path, staging_dir, io_config):
+    """把输入复制到本地暂存目录，返回本地路径（保留原文件名，放在按原路径区分的子目录中）"""
+    key = hashlib.sha1(os.path.abspath(input_path).encode('utf-8')).hexdigest()[:16]
+    local_path = os.path.join(staging_dir, key, os.path.basename(input_path))
+    copy_file(input_path, local_path, io_config)
+    return local_path
+
+def release_input(local_path):
+    """删除已处理完的暂存输入"""
+    if local_path:
+        shutil.rmtree(os.path.dirname(local_path), ignore_errors=True)
+
+def prefetch_inputs(items, executor, staging_dir, io_config, depth=DEFAULT_PREFETCH, should_stage=None, stop=None):
+    """
+    边扫描边预取: 始终保持 depth 个后续输入在后台复制，按原顺序逐个生成 (条目, 本地路径)
+    items 的条目第一项为输入路径；should_stage(条目) 为False时不复制，复制失败时也回退为直接读取，本地路径为None
+    stop() 为True后（例如测试任务失败）不再提交新的复制，还没开始的复制取消，之后的条目本地路径都为None
+    """
+    pending = deque()
+    stopped = False
+
+    def resolve(entry):
+        item, future = entry
+        if future is None or future.cancelled():
+            return item, None
+        try:
+            return item, future.result()
+        except OSError as e:
+            print(f"⚠️  警告: 暂存 {os.path.basename(item[0])} 失败，直接读取原文件: {str(e)}")
+            return item, None
+
+    for item in items:
+        if not stopped and stop is not None and stop():
+            stopped = True
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+        future = None
+        if not stopped and (should_stage is None or should_stage(item)):
+            future = executor.submit(stage_input, item[0], staging_dir, io_config)
+        pending.append((item, future))
+        if len(pending) > depth:
+            yield resolve(pending.popleft())
+    while pending:
+        yield resolve(pending.popleft())
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import subprocess
+
+import auto_placement
+
+# 夹层文件缓存（解码代价高的原视频）
+# 4K HEVC / ProRes 等原视频的解码时间常常超过编码本身；开启后第一次处理时把原视频转成
+# 全帧内、低压缩、解码很快的中间文件（按输入文件指纹缓存），之后同一视频的其它平台任务和
+# 修改配置后的重新运行都改从夹层文件解码；缓存总大小超过预算时按最近使用时间淘汰
+# 全局配置 "mezzanine": {"enabled": true, "dir": "mezzanine_cache", "budget_gb": 100,
+#                        "codecs": ["hevc", "prores", "av1", "vp9"], "min_pixels": 3686400, "format": "h264_intra"}
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mezzanine_cache")
+INDEX_FILENAME = "index.json"
+
+DEFAULT_BUDGET_GB = 100
+
+# 默认只对这些编码格式、且不小于1440p的原视频生成夹层文件
+DEFAULT_CODECS = ('hevc', 'prores', 'av1', 'vp9')
+DEFAULT_MIN_PIXELS = 2560 * 1440
+
+# 夹层文件格式: h264_intra 为全帧内、关闭CABAC和去块滤波的H.264（体积约为原视频的数倍）；
+# utvideo 为无损格式，解码最快但体积很大
+MEZZANINE_FORMATS = {
+    'h264_intra': ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'fastdecode', '-g', '1', '-crf', '12'],
+    'utvideo': ['-c:v', 'utvideo']
+}
+
+_index = None
+_index_dir = None
+_index_lock = threading.Lock()
+
+def load_index(cache_dir):
+    """读取缓存索引 {指纹: {'path', 'size', 'last_used', 'source'}}"""
+    global _index, _index_dir
+    if _index is None or _index_dir != cache_dir:
+        try:
+            with open(os.path.join(cache_dir, INDEX_FILENAME), 'r', encoding='utf-8') as f:
+                _index = json.load(f)
+        except (OSError, ValueError):
+            _index = {}
+        _index_dir = cache_dir
+    return _index
+
+def save_index(cache_dir):
+    """保存缓存索引"""
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(_index, f, ensure_ascii=False, indent=1)
+    except OSError as e:
+        print(f"⚠️  警告: 保存夹层缓存索引失败: {str(e)}")
+
+def should_use_mezzanine(video_info, mezzanine_config):
+    """原视频是否值得生成夹层文件（编码格式在列表中且分辨率足够大）"""
+    codecs = mezzanine_config.get('codecs', DEFAULT_CODECS)
+    min_pixels = mezzanine_config.get('min_pixels', DEFAULT_MIN_PIXELS)
+    return video_info.get('codec') in codecs and video_info['width'] * video_info['height'] >= min_pixels
+
+def evict(index, cache_dir, budget_bytes, keep=None):
+    """按最近使用时间从旧到新删除夹层文件，直到总大小不超过预算（keep 为刚生成的条目，不删除）"""
+    for fingerprint in [key for key, entry in index.items() if not os.path.exists(entry['path'])]:
+        del index[fingerprint]
+
+    total = sum(entry['size'] for entry in index.values())
+    for fingerprint, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+        if total <= budget_bytes:
+            break
+        if fingerprint == keep:
+            continue
+        try:
+            os.remove(entry['path'])
+        except OSError as e:
+            print(f"⚠️  警告: 删除夹层文件失败: {str(e)}")
+            continue
+        total -= entry['size']
+        del index[fingerprint]
+        print(f"已淘汰夹层文件: {os.path.basename(entry['source'])} ({entry['size']/1024/1024:.0f}MB)")
+
+def create_mezzanine(input_path, cache_dir, fingerprint, mezzanine_format):
+    """把原视频转成夹层文件（视频转为帧内格式，音频直接复制），失败时返回None"""
+    os.makedirs(cache_dir, exist_ok=True)
+    mezzanine_path = os.path.join(cache_dir, f"{fingerprint}.mkv")
+
+    # 先写临时文件再改名，中断时不会留下不完整的缓存
+    fd, temp_path = tempfile.mkstemp(suffix='.mkv', dir=cache_dir)
+    os.close(fd)
+    cmd = ['ffmpeg', '-v', 'error', '-y', '-i', input_path, '-map', '0:v:0', '-map', '0:a?'] + \
+        MEZZANINE_FORMATS[mezzanine_format] + ['-c:a', 'copy', '-f', 'matroska', temp_path]
+    started = time.time()
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+        if result.returncode != 0:
+            print(f"⚠️  警告: 生成夹层文件失败，直接解码原视频: {result.stderr.strip()[-300:]}")
+            return None
+        os.replace(temp_path, mezzanine_path)
+    except subprocess.TimeoutExpired:
+        print("⚠️  警告: 生成夹层文件超时，直接解码原视频")
+        return None
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    print(f"已生成夹层文件: {os.path.getsize(mezzanine_path)/1024/1024:.0f}MB, 耗时 {time.time() - started:.1f}秒")
+    return mezzanine_path
+
+def get_mezzanine(source_path, input_path, video_info, mezzanine_config):
+    """
+    返回用于解码的夹层文件路径（缓存中没有时先生成），不适用或生成失败时返回None
+    source_path 为原始输入路径（用于指纹），input_path 为实际读取的路径（输入暂存到本地时为本地副本）
+    """
+    if not mezzanine_config.get('enabled', False) or not should_use_mezzanine(video_info, mezzanine_config):
+        return None
+    mezzanine_format = mezzanine_config.get('format', 'h264_intra')
+    if mezzanine_format not in MEZZANINE_FORMATS:
+        print(f"⚠️  警告: 未知的夹层文件格式 {mezzanine_format}（可选: {', '.join(MEZZANINE_FORMATS)}）")
+        return None
+
+    cache_dir = mezzanine_config.get('dir', DEFAULT_CACHE_DIR)
+    budget_bytes = mezzanine_config.get('budget_gb', DEFAULT_BUDGET_GB) * 1024 ** 3
+    # 格式不同的夹层文件分开缓存
+    fingerprint = f"{auto_placement.get_fingerprint(source_path)}_{mezzanine_format}"
+
+    with _index_lock:
+        index = load_index(cache_dir)
+        entry = index.get(fingerprint)
+        if entry and os.path.exists(entry['path']):
+            entry['last_used'] = time.time()
+            save_index(cache_dir)
+            print(f"使用夹层文件解码: {os.path.basename(entry['path'])}")
+            return entry['path']
+
+    print(f"正在生成夹层文件 ({mezzanine_format})...")
+    mezzanine_path = create_mezzanine(input_path, cache_dir, fingerprint, mezzanine_format)
+    if mezzanine_path is None:
+        return None
+    size = os.path.getsize(mezzanine_path)
+    if size > budget_bytes:
+        print(f"⚠️  警告: 夹层文件 ({size/1024/1024:.0f}MB) 超过缓存预算，不保留")
+        os.remove(mezzanine_path)
+        return None
+
+    with _index_lock:
+        index = load_index(cache_dir)
+        index[fingerprint] = {
+            'path': mezzanine_path,
+            'size': size,
+            'last_used': time.time(),
+            'source': os.path.abspath(source_path)
+        }
+        evict(index, cache_dir, budget_bytes, keep=fingerprint)
+        save_index(cache_dir)
+    return mezzanine_path
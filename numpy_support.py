@@ -0,0 +1,19 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# NumPy 为可选依赖: 自动位置、水印校验和隐形水印共用同一个检查
+
+def check_numpy(feature, fallback=None):
+    """
+    检查NumPy是否可用，不可用时打印提示
+    feature 为需要NumPy的功能名称；fallback 为缺少NumPy时的降级说明（为空表示该功能无法继续，按错误提示）
+    """
+    if np is not None:
+        return True
+    if fallback:
+        print(f"⚠️  警告: {feature}需要NumPy (pip install numpy)，{fallback}")
+    else:
+        print(f"❌ {feature}需要NumPy，请先安装: pip install numpy")
+    return False
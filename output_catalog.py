@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+import traceback
+
+# 输出目录分片和输出目录索引
+# 全局配置 "output": {"shard_by": ["platform", "date", "hash"], "catalog": true}
+# 分片后输出写到 output_videos/抖音精选/2024-05-01/3f/xxx_抖音精选_带水印.mp4，避免单个目录文件过多；
+# 每个输出记录到 SQLite 索引（来源、平台、配置哈希、大小、时长、校验和），按平台/日期/来源查询不需要遍历目录
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+# 可用的分片层级（按配置顺序逐级建目录）
+SHARD_KEYS = ('platform', 'date', 'hash')
+
+# 来源名称哈希前缀长度（2位十六进制 = 256个子目录）
+HASH_PREFIX_LENGTH = 2
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    batch_id TEXT,
+    job_id TEXT,
+    created_date TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    settings_hash TEXT NOT NULL,
+    size INTEGER,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    codec TEXT,
+    checksum TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outputs_platform_date ON outputs (platform, created_date);
+CREATE INDEX IF NOT EXISTS idx_outputs_date ON outputs (created_date);
+CREATE INDEX IF NOT EXISTS idx_outputs_source ON outputs (source_name);
+CREATE INDEX IF NOT EXISTS idx_outputs_settings ON outputs (settings_hash);
+"""
+
+_catalog_lock = threading.Lock()
+
+def get_shard_dir(output_dir, platform_name, source_name, shard_by, date=None):
+    """
+    按分片配置计算输出子目录并创建
+    platform: 平台中文名；date: 处理日期；hash: 来源名称哈希前缀
+    """
+    parts = []
+    for key in shard_by or ():
+        if key == 'platform':
+            parts.append(platform_name)
+        elif key == 'date':
+            parts.append(date or time.strftime("%Y-%m-%d"))
+        elif key == 'hash':
+            parts.append(hashlib.sha1(source_name.encode('utf-8')).hexdigest()[:HASH_PREFIX_LENGTH])
+        else:
+            print(f"⚠️  警告: 未知的分片方式 {key}（可选: {', '.join(SHARD_KEYS)}）")
+    shard_dir = os.path.join(output_dir, *parts)
+    os.makedirs(shard_dir, exist_ok=True)
+    return shard_dir
+
+def get_settings_hash(platform_config, global_config):
+    """输出配置的哈希（配置改动后可以查出哪些输出需要重新生成）"""
+    settings = json.dumps([platform_config, global_config], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(settings.encode('utf-8')).hexdigest()[:16]
+
+def get_checksum(path):
+    """输出的SHA-256（hls/dash 为整个输出目录按文件名排序后的所有文件）"""
+    if path.endswith(('.m3u8', '.mpd')):
+        output_dir = os.path.dirname(path)
+        files = sorted(
+            os.path.join(output_dir, name) for name in os.listdir(output_dir)
+            if os.path.isfile(os.path.join(output_dir, name))
+        )
+    else:
+        files = [path]
+
+    digest = hashlib.sha256()
+    for file_path in files:
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(CHECKSUM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def connect(catalog_path):
+    """打开索引数据库（不存在时建表）"""
+    connection = sqlite3.connect(catalog_path, timeout=30)
+    connection.executescript(SCHEMA)
+    return connection
+
+def record_outputs(catalog_path, output_dir, entries):
+    """
+    把一批输出写入索引（同一路径重复生成时覆盖旧记录）
+    entries 中每项包含 path / kind / source / platform / settings_hash，以及可选的
+    batch_id / job_id / size / duration / width / height / codec
+    """
+    if not entries:
+        return
+    rows = []
+    for entry in entries:
+        path = entry['path']
+        try:
+            checksum = get_checksum(path)
+        except OSError as e:
+            print(f"⚠️  警告: 计算 {os.path.basename(path)} 的校验和失败: {str(e)}")
+            checksum = None
+        rows.append((
+            os.path.relpath(path, output_dir),
+            entry['kind'],
+            entry['source'],
+            os.path.splitext(os.path.basename(entry['source']))[0],
+            entry['platform'],
+            entry.get('batch_id'),
+            entry.get('job_id'),
+            time.strftime("%Y-%m-%d"),
+            time.strftime("%Y-%m-%d %H:%M:%S"),
+            entry['settings_hash'],
+            entry.get('size'),
+            entry.get('duration'),
+            entry.get('width'),
+            entry.get('height'),
+            entry.get('codec'),
+            checksum
+        ))
+
+    try:
+        with _catalog_lock:
+            connection = connect(catalog_path)
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+            finally:
+                connection.close()
+    except sqlite3.Error as e:
+        print(f"⚠️  警告: 写入输出索引失败: {str(e)}")
+
+def query_outputs(catalog_path, platform=None, date=None, source=None, settings_hash=None, kind=None):
+    """按平台（平台key）/日期/来源名称/配置哈希/类型查询输出，返回字典列表（都走索引）"""
+    conditions = []
+    params = []
+    for column, value in (('platform', platform), ('created_date', date), ('source_name', source),
+                          ('settings_hash', settings_hash), ('kind', kind)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+
+    sql = "SELECT * FROM outputs"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY created_at, path"
+
+    connection = connect(catalog_path)
+    try:
+        connection.row_factory = sqlite3.Row
+        return [dict(row) for row in connection.execute(sql, params)]
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="输出索引查询")
+    parser.add_argument('--catalog', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "output_videos", CATALOG_FILENAME
+    ), help="索引数据库路径")
+    parser.add_argument('--platform', help="平台key，例如 weibo")
+    parser.add_argument('--date', help="处理日期 (YYYY-MM-DD，today 表示今天)")
+    parser.add_argument('--source', help="来源文件名（不含扩展名）")
+    parser.add_argument('--settings-hash', help="配置哈希")
+    parser.add_argument('--kind', choices=['video', 'image', 'cover', 'thumbnails', 'preview'],
+                        help="输出类型（cover / thumbnails / preview 为视频的附加输出）")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.catalog):
+        print(f"❌ 索引不存在: {args.catalog}")
+        sys.exit(1)
+
+    date = time.strftime("%Y-%m-%d") if args.date == 'today' else args.date
+    try:
+        rows = query_outputs(args.catalog, args.platform, date, args.source, args.settings_hash, args.kind)
+    except Exception as e:
+        print(f"❌ 查询索引时出错: {str(e)}")
+        print(traceback.format_exc())
+        sys.exit(1)
+
+    output_dir = os.path.dirname(os.path.abspath(args.catalog))
+    for row in rows:
+        print(os.path.join(output_dir, row['path']))
+    print(f"\n共 {len(rows)} 个输出, {sum(row['size'] or 0 for row in rows)/1024/1024:.1f}MB", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+
+# 附加输出: 封面图、缩略图条、预览GIF
+# 在加水印的同一个滤镜图中，把叠加后的画面split出几路，分别select/scale/tile后输出，
+# 不需要上传程序再对每个输出视频重新解码
+# 全局/平台配置 "side_outputs": {
+#     "cover": {"time": 1.0, "width": 720},
+#     "thumbnails": {"count": 10, "columns": 5, "width": 320},
+#     "preview": {"start": 0, "duration": 3, "fps": 10, "width": 320}
+# }（某一项写 true 时使用默认参数）
+
+SIDE_OUTPUT_KINDS = ('cover', 'thumbnails', 'preview')
+
+# 输出文件名后缀（接在 xxx_平台_带水印 之后）
+SIDE_OUTPUT_SUFFIXES = {
+    'cover': '_封面.jpg',
+    'thumbnails': '_缩略图.jpg',
+    'preview': '_预览.gif'
+}
+
+DEFAULT_COVER = {'time': 1.0, 'width': 720}
+DEFAULT_THUMBNAILS = {'count': 10, 'columns': None, 'width': 320}
+DEFAULT_PREVIEW = {'start': 0, 'duration': 3, 'fps': 10, 'width': 320}
+
+def get_side_output_config(global_config, platform_config):
+    """合并全局和平台的附加输出配置（平台覆盖全局，某项为 false 时关闭），返回 {类型: 参数}"""
+    merged = dict(global_config.get('side_outputs', {}))
+    merged.update(platform_config.get('side_outputs', {}))
+    defaults = {'cover': DEFAULT_COVER, 'thumbnails': DEFAULT_THUMBNAILS, 'preview': DEFAULT_PREVIEW}
+
+    side_config = {}
+    for kind in SIDE_OUTPUT_KINDS:
+        value = merged.get(kind)
+        if not value:
+            continue
+        side_config[kind] = dict(defaults[kind], **(value if isinstance(value, dict) else {}))
+    return side_config
+
+def build_cover_filter(options, duration):
+    """封面: 指定时间点之后的第一帧（时间超出视频时取中间位置）"""
+    time_point = options['time']
+    if duration:
+        time_point = min(time_point, duration / 2)
+    return f"select='gte(t,{time_point})',trim=end_frame=1,scale={options['width']}:-2"
+
+def build_thumbnails_filter(options, duration):
+    """
+    缩略图条: 在整段视频中均匀取 count 帧拼成网格（默认一行）
+    取样点固定为每段的中点，画面时间每越过一个取样点选一帧（不按上一帧累加间隔，避免误差累积少取最后一帧）
+    """
+    count = options['count']
+    columns = options['columns'] or count
+    rows = (count + columns - 1) // columns
+    interval = duration / count
+    slot = f"floor((t-{interval / 2:.3f})/{interval:.3f})"
+    previous_slot = f"floor((prev_selected_t-{interval / 2:.3f})/{interval:.3f})"
+    return (
+        f"select='gte(t,{interval / 2:.3f})*if(isnan(prev_selected_t),1,gt({slot},{previous_slot}))',"
+        f"scale={options['width']}:-2,tile={columns}x{rows}"
+    )
+
+def build_preview_filters(options, label, output_label):
+    """预览GIF: 截取一小段，降帧率缩放后生成调色板，避免GIF色带"""
+    return [
+        f"[{label}]trim=start={options['start']}:duration={options['duration']},setpts=PTS-STARTPTS,"
+        f"fps={options['fps']},scale={options['width']}:-2:flags=lanczos,split[{label}_pa][{label}_pb]",
+        f"[{label}_pa]palettegen=stats_mode=diff[{label}_pal]",
+        f"[{label}_pb][{label}_pal]paletteuse=dither=bayer[{output_label}]"
+    ]
+
+def build_side_outputs(source_label, side_config, output_base, duration=None):
+    """
+    构建附加输出的滤镜和输出参数
+    source_label 为叠加完所有图层后的画面标签，output_base 为不含扩展名的输出路径
+    返回 (滤镜列表, 主输出改用的标签, [{'kind', 'path', 'args'}])；没有附加输出时滤镜列表为空、标签不变
+    """
+    kinds = [kind for kind in SIDE_OUTPUT_KINDS if kind in side_config]
+    if 'thumbnails' in kinds and not duration:
+        print("⚠️  警告: 视频时长未知，跳过缩略图条")
+        kinds.remove('thumbnails')
+    if not kinds:
+        return [], source_label, []
+
+    # 主输出和每个附加输出各占split的一路（标签不能含冒号，例如 0:v）
+    base_label = source_label.replace(':', '_')
+    main_label = f"{base_label}_main"
+    side_labels = [f"{base_label}_{kind}" for kind in kinds]
+    filter_parts = [
+        f"[{source_label}]split={len(kinds) + 1}[{main_label}]" + "".join(f"[{label}]" for label in side_labels)
+    ]
+
+    outputs = []
+    for kind, label in zip(kinds, side_labels):
+        options = side_config[kind]
+        output_label = f"{label}_out"
+        path = output_base + SIDE_OUTPUT_SUFFIXES[kind]
+        if kind == 'cover':
+            filter_parts.append(f"[{label}]{build_cover_filter(options, duration)}[{output_label}]")
+            args = ['-frames:v', '1', '-q:v', '2']
+        elif kind == 'thumbnails':
+            filter_parts.append(f"[{label}]{build_thumbnails_filter(options, duration)}[{output_label}]")
+            args = ['-frames:v', '1', '-q:v', '3']
+        else:
+            filter_parts.extend(build_preview_filters(options, label, output_label))
+            args = ['-loop', '0']
+        outputs.append({
+            'kind': kind,
+            'path': path,
+            'args': ['-map', f"[{output_label}]"] + args + [path]
+        })
+    return filter_parts, main_label, outputs
+
+def collect_side_outputs(outputs):
+    """返回实际生成的附加输出（没有生成文件的打印警告，例如截取时间超出视频）"""
+    produced = []
+    for output in outputs:
+        if os.path.exists(output['path']) and os.path.getsize(output['path']) > 0:
+            produced.append(output)
+        else:
+            print(f"⚠️  警告: 没有生成 {os.path.basename(output['path'])}")
+    return produced
@@ -0,0 +1,104 @@
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+
+# 输出大小和编码耗时预测
+# 用与正式任务完全相同的滤镜图和编码参数，编码几段均匀分布的短片段，按时长外推整段的输出大小和耗时；
+# 预测结果用于检查磁盘剩余空间，以及在平台有上传大小限制（"max_size_mb"）时调整目标码率
+# 全局配置 "predict": {"enabled": true, "samples": 3, "sample_seconds": 2, "reserve_mb": 1024, "wait_seconds": 0}
+
+DEFAULT_SAMPLES = 3
+DEFAULT_SAMPLE_SECONDS = 2.0
+
+# 磁盘上始终保留的空间
+DEFAULT_RESERVE_MB = 1024
+
+# 等待磁盘空间时的检查间隔（秒）
+SPACE_POLL_INTERVAL = 30
+
+# 封装开销（片段用mkv计量，正式输出的mp4/ts头部和索引）
+CONTAINER_OVERHEAD = 1.02
+
+# 按上传大小限制计算码率时留出的余量（码率控制不是精确的）
+SIZE_CAP_MARGIN = 0.92
+
+def get_audio_bitrate(video_path):
+    """原视频音频码率（bps，音频直接复制，没有音频时为0；码率未知时按128kbps估算）"""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+        '-show_entries', 'stream=bit_rate', '-of', 'default=noprint_wrappers=1:nokey=1', video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    value = result.stdout.strip()
+    if result.returncode != 0 or not value:
+        return 0
+    return int(value) if value.isdigit() else 128000
+
+def predict_job(input_args, filter_graph, outputs, duration,
+                samples=DEFAULT_SAMPLES, sample_seconds=DEFAULT_SAMPLE_SECONDS):
+    """
+    编码几段短片段并外推
+    outputs 为 [(滤镜图输出标签, 视频编码参数)]，与正式任务相同；只编码视频，不含音频
+    返回 {'video_bytes': [每个输出的视频字节数], 'seconds': 预计编码秒数}，失败时返回None
+    """
+    if duration <= samples * sample_seconds:
+        # 短视频直接完整编码一次，预测即为实际大小
+        samples, sample_seconds = 1, duration
+
+    sizes = [0] * len(outputs)
+    elapsed = 0.0
+    sampled_seconds = 0.0
+    with tempfile.TemporaryDirectory() as sample_dir:
+        for i in range(samples):
+            start = max(duration * (i + 0.5) / samples - sample_seconds / 2, 0)
+            # -ss / -t 写在第一个 -i 之前，只作用于视频输入
+            cmd = ['ffmpeg', '-v', 'error', '-y', '-ss', f'{start:.3f}', '-t', f'{sample_seconds:.3f}'] + input_args
+            cmd += ['-filter_complex', filter_graph]
+            for j, (label, encode_args) in enumerate(outputs):
+                cmd += ['-map', f'[{label}]', '-an'] + encode_args + ['-f', 'matroska', os.path.join(sample_dir, f'{j}.mkv')]
+
+            started = time.time()
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            elapsed += time.time() - started
+            if result.returncode != 0:
+                print(f"⚠️  警告: 预测片段编码失败: {result.stderr.strip()[-300:]}")
+                return None
+
+            sampled_seconds += min(sample_seconds, duration - start)
+            for j in range(len(outputs)):
+                sizes[j] += os.path.getsize(os.path.join(sample_dir, f'{j}.mkv'))
+
+    if sampled_seconds <= 0:
+        return None
+    factor = duration / sampled_seconds
+    return {
+        'video_bytes': [int(size * factor * CONTAINER_OVERHEAD) for size in sizes],
+        'seconds': elapsed * factor
+    }
+
+def fit_bitrate_to_cap(max_bytes, audio_bitrate, duration):
+    """在上传大小限制内可用的视频码率（bps），限制小于音频大小时返回0"""
+    video_bytes = max_bytes * SIZE_CAP_MARGIN / CONTAINER_OVERHEAD - audio_bitrate * duration / 8
+    return max(int(video_bytes * 8 / duration), 0)
+
+def check_free_space(output_dir, needed_bytes, reserve_mb=DEFAULT_RESERVE_MB, wait_seconds=0):
+    """
+    检查输出目录所在磁盘是否放得下预测的输出（保留 reserve_mb）
+    空间不足时最多等待 wait_seconds 秒（例如等待上传程序清理已上传的文件），仍不足时返回False
+    """
+    reserve_bytes = reserve_mb * 1024 * 1024
+    waited = 0
+    while True:
+        free_bytes = shutil.disk_usage(output_dir).free
+        if free_bytes - reserve_bytes >= needed_bytes:
+            return True
+        if waited >= wait_seconds:
+            print(f"❌ 磁盘空间不足: 预计需要 {needed_bytes/1024/1024:.0f}MB，"
+                  f"剩余 {free_bytes/1024/1024:.0f}MB（保留 {reserve_mb}MB）")
+            return False
+        print(f"⏳ 磁盘空间不足，等待释放空间... (剩余 {free_bytes/1024/1024:.0f}MB)")
+        interval = min(SPACE_POLL_INTERVAL, wait_seconds - waited)
+        time.sleep(interval)
+        waited += interval
@@ -0,0 +1,85 @@
+import pytest
+
+from watermark_layout import get_layout_plan, check_layout_plans
+
+# 固定配置的布局回归测试: 每个 (配置, 分辨率) 的水印位置和尺寸 (x, y, 宽, 高) 都写死，
+# 横屏/竖屏/4:3/方形画面的布局规则改动后需要同时更新这里的期望值
+# 水印图片均为 300x100，全局缩放比例 0.10
+
+GLOBAL_CONFIG = {'size': {'scale': 0.10}}
+
+WATERMARK_SIZE = (300, 100)
+
+PLATFORM_CONFIGS = {
+    # 左上: 基准画面 (100, 200)，贴近左/上边缘
+    'top_left': {'position_mode': 'coordinates', 'coordinates': {'x': 100, 'y': 200}},
+    # 右下: 相对边距
+    'bottom_right': {'position_mode': 'margins', 'margins': {'right_margin': 50, 'bottom_margin': 50}},
+    # 底部居中: X按中心比例，Y贴近下边缘
+    'bottom_center': {'position_mode': 'coordinates', 'coordinates': {'x': 798, 'y': 922}},
+    # 竖屏单独配置: 顶部居中，缩放比例 0.08
+    'portrait_override': {
+        'position_mode': 'coordinates',
+        'coordinates': {'x': 100, 'y': 200},
+        'portrait': {'coordinates': {'x': 378, 'y': 300}, 'scale': 0.08}
+    }
+}
+
+EXPECTED_LAYOUTS = {
+    'top_left': {
+        (3840, 2160): (200, 400, 648, 216),
+        (1920, 1080): (100, 200, 324, 108),
+        (1280, 720): (66, 133, 216, 72),
+        (1440, 1080): (100, 200, 324, 108),
+        (1080, 1920): (100, 200, 324, 108),
+        (720, 1280): (66, 133, 216, 72),
+        (1080, 1350): (100, 200, 324, 108),
+        (1080, 1080): (100, 200, 324, 108)
+    },
+    'bottom_right': {
+        (3840, 2160): (3092, 1844, 648, 216),
+        (1920, 1080): (1546, 922, 324, 108),
+        (1280, 720): (1031, 615, 216, 72),
+        (1440, 1080): (1066, 922, 324, 108),
+        (1080, 1920): (706, 1762, 324, 108),
+        (720, 1280): (471, 1175, 216, 72),
+        (1080, 1350): (706, 1192, 324, 108),
+        (1080, 1080): (706, 922, 324, 108)
+    },
+    'bottom_center': {
+        (3840, 2160): (1596, 1844, 648, 216),
+        (1920, 1080): (798, 922, 324, 108),
+        (1280, 720): (532, 615, 216, 72),
+        (1440, 1080): (558, 922, 324, 108),
+        (1080, 1920): (378, 1762, 324, 108),
+        (720, 1280): (252, 1175, 216, 72),
+        (1080, 1350): (378, 1192, 324, 108),
+        (1080, 1080): (378, 922, 324, 108)
+    },
+    'portrait_override': {
+        (3840, 2160): (200, 400, 648, 216),
+        (1920, 1080): (100, 200, 324, 108),
+        (1280, 720): (66, 133, 216, 72),
+        (1440, 1080): (100, 200, 324, 108),
+        (1080, 1920): (378, 300, 258, 86),
+        (720, 1280): (252, 200, 171, 57),
+        (1080, 1350): (378, 300, 258, 86),
+        (1080, 1080): (100, 200, 324, 108)
+    }
+}
+
+CASES = [
+    (platform, resolution, expected)
+    for platform, layouts in EXPECTED_LAYOUTS.items()
+    for resolution, expected in layouts.items()
+]
+
+@pytest.mark.parametrize("platform, resolution, expected", CASES,
+                         ids=[f"{platform}-{width}x{height}" for platform, (width, height), _ in CASES])
+def test_layout_plan(platform, resolution, expected):
+    plan = get_layout_plan(resolution[0], resolution[1], *WATERMARK_SIZE,
+                           dict(PLATFORM_CONFIGS[platform]), GLOBAL_CONFIG, verbose=False)
+    assert (plan['x'], plan['y'], plan['width'], plan['height']) == expected
+
+def test_layout_plan_invariants():
+    assert check_layout_plans(PLATFORM_CONFIGS, GLOBAL_CONFIG) == []
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import argparse
+import threading
+import unicodedata
+
+import auto_placement
+
+# 水印布局计算（视频和图片批处理共用）
+# 配置中的坐标和边距按基准画面填写: 横屏 1920x1080；平台/图层配置 "portrait" 时竖屏画面使用其中的值（基准 1080x1920）
+# 水印尺寸和到边缘的距离按短边缩放，同一配置在横屏、竖屏和其它宽高比的画面上保持一致的观感
+# 非自动模式的布局只取决于画面尺寸、水印尺寸和配置，按类别计算一次后存入布局表，之后的任务直接查表
+
+LANDSCAPE_BASE = (1920, 1080)
+PORTRAIT_BASE = (1080, 1920)
+
+# 相对坐标的锚定区域: 水印中心位于基准画面前1/3时贴近左/上边，后1/3时贴近右/下边，其余按中心比例
+ZONE_NEAR = 1 / 3
+ZONE_FAR = 2 / 3
+
+ANCHOR_NAMES = {
+    ('x', 'near'): '左', ('x', 'center'): '中', ('x', 'far'): '右',
+    ('y', 'near'): '上', ('y', 'center'): '中', ('y', 'far'): '下'
+}
+
+# 影响布局的配置项（布局表的键）
+LAYOUT_KEYS = ('position_mode', 'coordinates', 'margins', 'scale', 'portrait')
+
+_layout_plans = {}
+_layout_plans_lock = threading.Lock()
+
+def get_orientation(width, height):
+    """画面方向: portrait（竖屏）或 landscape（横屏，含正方形）"""
+    return 'portrait' if height > width else 'landscape'
+
+def resolve_orientation_config(platform_config, frame_width, frame_height):
+    """
+    按画面方向选择布局配置和基准画面，返回 (配置, (基准宽, 基准高))
+    竖屏画面且配置了 "portrait" 时使用其中的坐标/边距/缩放，否则使用横屏配置，由锚定规则映射到实际画面
+    """
+    portrait = platform_config.get('portrait')
+    if portrait and get_orientation(frame_width, frame_height) == 'portrait':
+        resolved = dict(platform_config)
+        resolved.update(portrait)
+        return resolved, PORTRAIT_BASE
+    return platform_config, LANDSCAPE_BASE
+
+def get_layer_scale(layer, global_config, frame_width, frame_height):
+    """图层缩放比例（水印高度占画面短边的比例）"""
+    config, _ = resolve_orientation_config(layer, frame_width, frame_height)
+    return config.get('scale', global_config['size']['scale'])
+
+def get_font_size(layer, global_config, frame_width, frame_height):
+    """文字图层字号（与图片图层高度的计算方式相同）"""
+    scale = get_layer_scale(layer, global_config, frame_width, frame_height)
+    return max(int(min(frame_width, frame_height) * scale), 1)
+
+def map_axis(base_position, base_watermark_size, base_length, watermark_size, length, unit):
+    """
+    把基准画面中一个方向上的坐标映射到实际画面，返回 (坐标, 锚定方式)
+    贴近边缘时保持到该边缘的距离（按短边缩放 unit），位于中间时保持水印中心的比例
+    """
+    center = (base_position + base_watermark_size / 2) / base_length
+    if center < ZONE_NEAR:
+        return int(base_position * unit), 'near'
+    if center > ZONE_FAR:
+        far_gap = base_length - base_position - base_watermark_size
+        return length - watermark_size - int(far_gap * unit), 'far'
+    return int(length * center - watermark_size / 2), 'center'
+
+def calculate_watermark_layout(video_width, video_height, watermark_width, watermark_height,
+                               platform_config, global_config, scale=None, verbose=True,
+                               analysis=None, avoid_regions=()):
+    """
+    根据视频分辨率计算水印尺寸和位置（相对坐标/相对边距/自动，横屏/竖屏分别有基准画面）
+    scale 为空时使用配置的缩放比例；verbose 为False时不打印计算过程（图片批处理使用）
+    自动模式使用 auto_placement 的画面分析结果 analysis，avoid_regions 为已被占用的角落
+    """
+    log = print if verbose else (lambda *args: None)
+    
+    config, (base_width, base_height) = resolve_orientation_config(platform_config, video_width, video_height)
+    if scale is None:
+        scale = config.get('scale', global_config['size']['scale'])
+    
+    # 计算水印大小 - 高度按画面短边缩放，保持原始宽高比
+    short_side = min(video_width, video_height)
+    new_height = int(short_side * scale)
+    # 根据原始宽高比计算新宽度
+    aspect_ratio = watermark_width / watermark_height
+    new_width = int(new_height * aspect_ratio)
+    
+    log(f"水印调整后尺寸: {new_width}x{new_height} (缩放比例: {scale*100}%)")
+    log(f"调整后宽高比: {new_width/new_height:.2f}:1")
+    
+    # 距离换算: 基准画面短边上的1像素对应实际画面的像素数
+    unit = short_side / min(base_width, base_height)
+    
+    # 计算水印位置 - 基于相对位置的比例
+    position_mode = config['position_mode']
+    region = None
+    anchor = (True, True)
+    
+    if position_mode == 'auto' and not analysis:
+        log("⚠️  警告: 没有画面分析结果，自动位置回退到相对边距")
+        position_mode = 'margins'
+    
+    if position_mode == 'auto':
+        # 根据画面分析选择代价最低的角落（避开黑边、字幕和复杂画面）
+        x, y, region = auto_placement.choose_position(
+            analysis, video_width, video_height, new_width, new_height,
+            avoid_regions=avoid_regions
+        )
+        anchor = (region.endswith('right'), region.startswith('bottom'))
+        position_info = f"自动位置: {auto_placement.REGION_NAMES[region]} ({x},{y})"
+        
+    elif position_mode == 'coordinates':
+        # 使用相对坐标: 按水印在基准画面中的位置分区锚定（左/中/右，上/中/下）
+        base_x = config['coordinates']['x']
+        base_y = config['coordinates']['y']
+        base_watermark_height = min(base_width, base_height) * scale
+        base_watermark_width = base_watermark_height * aspect_ratio
+        
+        x, x_anchor = map_axis(base_x, base_watermark_width, base_width, new_width, video_width, unit)
+        y, y_anchor = map_axis(base_y, base_watermark_height, base_height, new_height, video_height, unit)
+        anchor = (x_anchor == 'far', y_anchor == 'far')
+        
+        position_info = (
+            f"相对坐标: 原({base_x},{base_y})→新({x},{y}), "
+            f"锚定: {ANCHOR_NAMES[('x', x_anchor)]}/{ANCHOR_NAMES[('y', y_anchor)]}"
+        )
+        
+    else:
+        # 使用相对边距
+        margins = config.get('margins', {"right_margin": 50, "bottom_margin": 50})
+        
+        # 根据当前视频分辨率计算实际边距
+        right_margin = int(margins['right_margin'] * unit)
+        bottom_margin = int(margins['bottom_margin'] * unit)
+        
+        x = video_width - new_width - right_margin
+        y = video_height - new_height - bottom_margin
+        
+        position_info = f"相对边距: 右边距={right_margin}px, 底边距={bottom_margin}px"
+    
+    # 确保水印在视频范围内
+    original_x, original_y = x, y
+    
+    if x < 0:
+        x = 10
+        log(f"⚠️  警告: X坐标从 {original_x} 调整到 {x}")
+    if y < 0:
+        y = 10
+        log(f"⚠️  警告: Y坐标从 {original_y} 调整到 {y}")
+    if x + new_width > video_width:
+        x = video_width - new_width - 10
+        log(f"⚠️  警告: X坐标从 {original_x} 调整到 {x}")
+    if y + new_height > video_height:
+        y = video_height - new_height - 10
+        log(f"⚠️  警告: Y坐标从 {original_y} 调整到 {y}")
+    
+    log(f"水印位置: ({x}, {y})")
+    log(position_info)
+    
+    # 显示调试信息
+    log(f"基准分辨率: {base_width}x{base_height}")
+    log(f"当前分辨率: {video_width}x{video_height} ({'竖屏' if get_orientation(video_width, video_height) == 'portrait' else '横屏'})")
+    log(f"缩放比例: {unit:.2f}")
+    
+    return {
+        'width': new_width,
+        'height': new_height,
+        'x': x,
+        'y': y,
+        'region': region,
+        'anchor': anchor,
+        'position_info': position_info
+    }
+
+def get_layout_plan(video_width, video_height, watermark_width, watermark_height,
+                    layer, global_config, verbose=True, analysis=None, avoid_regions=()):
+    """
+    获取图层在某个画面尺寸下的布局方案
+    非自动模式按 (画面尺寸, 水印尺寸, 布局配置) 查布局表，首次遇到时计算并存入；
+    自动模式依赖每个视频的画面分析，每次单独计算
+    """
+    scale = get_layer_scale(layer, global_config, video_width, video_height)
+    if layer.get('position_mode') == 'auto':
+        return calculate_watermark_layout(
+            video_width, video_height, watermark_width, watermark_height,
+            layer, global_config, scale=scale, verbose=verbose,
+            analysis=analysis, avoid_regions=avoid_regions
+        )
+    
+    key = (
+        video_width, video_height, watermark_width, watermark_height, scale,
+        json.dumps({name: layer.get(name) for name in LAYOUT_KEYS}, sort_keys=True)
+    )
+    with _layout_plans_lock:
+        plan = _layout_plans.get(key)
+    
+    if plan is None:
+        plan = calculate_watermark_layout(
+            video_width, video_height, watermark_width, watermark_height,
+            layer, global_config, scale=scale, verbose=verbose
+        )
+        with _layout_plans_lock:
+            _layout_plans[key] = plan
+    elif verbose:
+        print(f"水印调整后尺寸: {plan['width']}x{plan['height']}")
+        print(f"水印位置: ({plan['x']}, {plan['y']}) [布局表]")
+        print(plan['position_info'])
+    
+    return dict(plan)
+
+def get_text_anchor(layer, layout):
+    """
+    文字图层的对齐方式，返回 (是否右对齐, 是否底对齐)
+    贴近右/下边缘的位置以右下角对齐，文字实际宽度与估算不同时边距依然准确
+    """
+    if 'anchor' in layout:
+        return layout['anchor']
+    if layout.get('region'):
+        return layout['region'].endswith('right'), layout['region'].startswith('bottom')
+    if layer.get('position_mode') == 'coordinates':
+        return False, False
+    return True, True
+
+def get_watermark_layers(platform_config, watermark_image_path):
+    """
+    获取平台的水印图层列表
+    未配置 layers 时使用平台水印图片和平台位置配置作为唯一图层；
+    图层中未设置的位置参数继承平台配置，相对路径的图片以水印目录为基准
+    """
+    layers = platform_config.get('layers')
+    if not layers:
+        layers = [{'image': watermark_image_path}]
+    
+    watermarks_dir = os.path.dirname(watermark_image_path)
+    resolved_layers = []
+    for layer in layers:
+        resolved = {
+            key: platform_config[key]
+            for key in ('position_mode', 'coordinates', 'margins', 'portrait')
+            if key in platform_config
+        }
+        resolved.update(layer)
+        if resolved.get('image') and not os.path.isabs(resolved['image']):
+            resolved['image'] = os.path.join(watermarks_dir, resolved['image'])
+        resolved_layers.append(resolved)
+    
+    return resolved_layers
+
+def estimate_text_size(text, font_size):
+    """估算文字水印的显示尺寸（中日韩全角字符按字号计宽，其余按0.6倍字号）"""
+    width = 0
+    for char in text:
+        if unicodedata.east_asian_width(char) in ('W', 'F'):
+            width += font_size
+        else:
+            width += font_size * 0.6
+    return max(int(width), 1), max(font_size, 1)
+
+# 布局自检使用的分辨率类别（横屏、竖屏、方形和非16:9画面）
+CHECK_RESOLUTIONS = [
+    (3840, 2160), (1920, 1080), (1280, 720), (854, 480), (1440, 1080),
+    (1080, 1920), (720, 1280), (1080, 1350), (1080, 1080)
+]
+CHECK_WATERMARK_SIZES = [(300, 100), (100, 100), (80, 240)]
+
+def legacy_coordinates_layout(video_width, video_height, watermark_width, watermark_height, coordinates, scale):
+    """旧版相对坐标算法（1920x1080基准，Y坐标超过0.6按底部计算），只用于自检对照；尺寸不取整"""
+    new_height = video_height * scale
+    new_width = new_height * watermark_width / watermark_height
+    x = int(video_width * coordinates['x'] / 1920)
+    y = int(video_height * coordinates['y'] / 1080)
+    if coordinates['y'] > 1080 * 0.6:
+        y = video_height - int(video_height * (1080 - coordinates['y']) / 1080)
+    return new_width, new_height, x, y
+
+def check_layout_plans(platforms, global_config, resolutions=CHECK_RESOLUTIONS,
+                       watermark_sizes=CHECK_WATERMARK_SIZES, verbose=False):
+    """
+    布局自检: 对每个平台 × 分辨率类别 × 水印尺寸生成布局方案并检查
+    1. 水印完全位于画面内；
+    2. 16:9横屏与旧版算法一致（比较锚定的边缘，误差不超过2像素，旧版位置越界时除外）；
+    3. 横屏配置映射到竖屏时保持锚定边缘，水印高度按短边缩放；
+    4. 查布局表与直接计算结果相同
+    返回问题列表（只检查规则，不固定具体坐标；固定配置下每个分辨率的期望坐标见 test_watermark_layout.py）
+    """
+    problems = []
+    for platform_key, platform_config in platforms.items():
+        layer = dict(platform_config)
+        if layer.get('position_mode') == 'auto':
+            continue
+        for video_width, video_height in resolutions:
+            for watermark_width, watermark_height in watermark_sizes:
+                label = f"{platform_key} {video_width}x{video_height} 水印{watermark_width}x{watermark_height}"
+                plan = get_layout_plan(video_width, video_height, watermark_width, watermark_height,
+                                       layer, global_config, verbose=False)
+                if verbose:
+                    print(f"{label}: ({plan['x']},{plan['y']}) {plan['width']}x{plan['height']} {plan['position_info']}")
+                
+                if (plan['x'] < 0 or plan['y'] < 0 or
+                        plan['x'] + plan['width'] > video_width or plan['y'] + plan['height'] > video_height):
+                    problems.append(f"{label}: 水印超出画面 ({plan['x']},{plan['y']})")
+                
+                direct = calculate_watermark_layout(video_width, video_height, watermark_width, watermark_height,
+                                                    layer, global_config, verbose=False)
+                if direct != plan:
+                    problems.append(f"{label}: 布局表与直接计算不一致")
+                
+                scale = get_layer_scale(layer, global_config, video_width, video_height)
+                if plan['height'] != int(min(video_width, video_height) * scale):
+                    problems.append(f"{label}: 水印高度 {plan['height']} 未按短边缩放")
+                
+                if layer.get('position_mode') != 'coordinates':
+                    continue
+                
+                if video_width * 9 == video_height * 16:
+                    legacy = legacy_coordinates_layout(video_width, video_height, watermark_width, watermark_height,
+                                                       layer['coordinates'], scale)
+                    legacy_in_frame = (legacy[2] >= 0 and legacy[3] >= 0 and
+                                       legacy[2] + legacy[0] <= video_width and legacy[3] + legacy[1] <= video_height)
+                    # 贴近右/下边缘时比较右/下边缘（水印尺寸取整不影响该边缘的位置）
+                    x_error = plan['x'] - legacy[2]
+                    y_error = plan['y'] - legacy[3]
+                    if plan['anchor'][0]:
+                        x_error += plan['width'] - legacy[0]
+                    if plan['anchor'][1]:
+                        y_error += plan['height'] - legacy[1]
+                    if legacy_in_frame and (abs(x_error) > 2 or abs(y_error) > 2):
+                        problems.append(f"{label}: 与旧版位置不一致 ({plan['x']},{plan['y']}) vs ({legacy[2]},{legacy[3]})")
+                
+                if get_orientation(video_width, video_height) == 'portrait' and not layer.get('portrait'):
+                    landscape = get_layout_plan(1920, 1080, watermark_width, watermark_height,
+                                                layer, global_config, verbose=False)
+                    if landscape['anchor'] != plan['anchor']:
+                        problems.append(f"{label}: 竖屏锚定 {plan['anchor']} 与横屏 {landscape['anchor']} 不一致")
+    
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="水印布局表自检")
+    parser.add_argument('--verbose', action='store_true', help="打印每个分辨率类别的布局方案")
+    args = parser.parse_args()
+    
+    from add_watermark_ffmpeg import load_config
+    config = load_config()
+    problems = check_layout_plans(config['platforms'], config['global'], verbose=args.verbose)
+    print(f"\n布局自检: {len(_layout_plans)} 个布局方案, 问题 {len(problems)} 个")
+    for problem in problems:
+        print(f"⚠️  {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import glob
+import subprocess
+from functools import lru_cache
+
+# 文字水印未指定字体时依次尝试的字体（需支持中文）
+DEFAULT_FONT_CANDIDATES = [
+    "msyh.ttc",
+    "simhei.ttf",
+    "PingFang.ttc",
+    "NotoSansCJK-Regular.ttc",
+    "wqy-microhei.ttc"
+]
+
+# 查找字体文件的系统目录
+FONT_DIRS = [
+    "C:/Windows/Fonts",
+    "/System/Library/Fonts",
+    "/Library/Fonts",
+    os.path.expanduser("~/.fonts"),
+    "/usr/share/fonts",
+    "/usr/local/share/fonts"
+]
+
+class TemplateVars(dict):
+    """模板变量字典，未知变量原样保留"""
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+def render_text_template(template, template_vars):
+    """渲染文字水印模板，例如 "{platform} {job_id}" """
+    return template.format_map(TemplateVars(template_vars))
+
+def merge_template_vars(source_path, global_config, platform_config, job_vars=None):
+    """合并模板变量: 文件名 < 全局 < 平台 < 任务（视频和图片共用）"""
+    template_vars = {'video_name': os.path.splitext(os.path.basename(source_path))[0]}
+    template_vars.update(global_config.get('template_vars', {}))
+    template_vars.update(platform_config.get('template_vars', {}))
+    template_vars.update(job_vars or {})
+    return template_vars
+
+@lru_cache(maxsize=None)
+def resolve_font_file(font=None):
+    """
+    解析字体文件路径（结果缓存，每个字体在进程内只查找一次）
+    font 可以是字体文件路径或字体文件名；为空时按默认中文字体列表查找
+    """
+    if font and os.path.isfile(font):
+        return font
+    
+    candidates = [font] if font else DEFAULT_FONT_CANDIDATES
+    for candidate in candidates:
+        for font_dir in FONT_DIRS:
+            if not os.path.isdir(font_dir):
+                continue
+            direct_path = os.path.join(font_dir, candidate)
+            if os.path.isfile(direct_path):
+                return direct_path
+            matches = glob.glob(os.path.join(font_dir, "**", candidate), recursive=True)
+            if matches:
+                return matches[0]
+    
+    # 最后尝试fontconfig
+    try:
+        result = subprocess.run(
+            ['fc-match', '-f', '%{file}', font or ':lang=zh'],
+            capture_output=True, text=True, timeout=10
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.strip()
+    except Exception:
+        pass
+    
+    print(f"⚠️  警告: 未找到字体 {font or '默认中文字体'}，将使用默认字体")
+    return None
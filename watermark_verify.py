@@ -0,0 +1,193 @@
+import os
+import subprocess
+import traceback
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+# 编码后的水印校验
+# 以低分辨率解码输出视频的几帧，在计算出的水印位置附近与缩放后的水印图片做归一化互相关
+
+# 分析时画面宽度上限（越小越快）
+ANALYSIS_MAX_WIDTH = 640
+
+# 允许的位置偏差（分析分辨率下的像素）
+SEARCH_RADIUS = 4
+
+DEFAULT_SAMPLES = 3
+DEFAULT_THRESHOLD = 0.5
+
+def load_watermark_reference(image_path, width, height):
+    """把水印图片缩放到分析尺寸，返回 (亮度, 不透明度) 两个数组"""
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', image_path,
+        '-vf', f'scale={width}:{height},format=ya8',
+        '-frames:v', '1', '-f', 'rawvideo', '-'
+    ]
+    result = subprocess.run(cmd, capture_output=True, timeout=60)
+    if result.returncode != 0 or len(result.stdout) < width * height * 2:
+        return None, None
+    pixels = np.frombuffer(result.stdout, dtype=np.uint8, count=width * height * 2).reshape(height, width, 2)
+    return pixels[:, :, 0].astype(np.float32), pixels[:, :, 1].astype(np.float32) / 255.0
+
+def sample_frames(video_path, width, height, samples, duration):
+    """在视频中均匀取样几帧，缩放到分析尺寸后以灰度返回（duration 为视频时长，秒）"""
+    duration = duration or 0.0
+    frames = []
+    for i in range(samples):
+        timestamp = duration * (i + 1) / (samples + 1)
+        cmd = [
+            'ffmpeg', '-v', 'error', '-ss', f'{timestamp:.3f}', '-i', video_path,
+            '-vf', f'scale={width}:{height}', '-frames:v', '1',
+            '-f', 'rawvideo', '-pix_fmt', 'gray', '-'
+        ]
+        result = subprocess.run(cmd, capture_output=True, timeout=120)
+        if result.returncode == 0 and len(result.stdout) >= width * height:
+            frames.append(np.frombuffer(result.stdout, dtype=np.uint8, count=width * height).reshape(height, width))
+    return frames
+
+def match_score(frame, reference, mask, x, y):
+    """
+    在期望位置周围 ±SEARCH_RADIUS 内搜索最佳匹配，返回 (得分, (dx, dy))
+    有纹理的水印用归一化互相关；纯色水印退化为像素接近比例
+    """
+    ref_height, ref_width = reference.shape
+    padded = np.pad(frame.astype(np.float32), SEARCH_RADIUS + max(ref_height, ref_width), mode='edge')
+    offset = SEARCH_RADIUS + max(ref_height, ref_width)
+    top = y + offset - SEARCH_RADIUS
+    left = x + offset - SEARCH_RADIUS
+    region = padded[top:top + ref_height + 2 * SEARCH_RADIUS, left:left + ref_width + 2 * SEARCH_RADIUS]
+
+    # (偏移行, 偏移列, 水印高, 水印宽) → 只取水印不透明像素
+    windows = sliding_window_view(region, (ref_height, ref_width))[:, :, mask]
+    ref_pixels = reference[mask]
+
+    if ref_pixels.std() > 5:
+        ref_centered = ref_pixels - ref_pixels.mean()
+        win_centered = windows - windows.mean(axis=-1, keepdims=True)
+        numerator = win_centered @ ref_centered
+        denominator = np.sqrt((win_centered ** 2).sum(axis=-1) * (ref_centered ** 2).sum()) + 1e-6
+        scores = numerator / denominator
+    else:
+        scores = (np.abs(windows - ref_pixels) < 20).mean(axis=-1)
+
+    best = np.unravel_index(np.argmax(scores), scores.shape)
+    return float(scores[best]), (int(best[1]) - SEARCH_RADIUS, int(best[0]) - SEARCH_RADIUS)
+
+def verify_layer(output_path, frames, layer, factor):
+    """校验单个图片图层"""
+    result = {'output': output_path, 'layer': os.path.basename(layer['image']), 'score': None, 'offset': None}
+
+    x, y = int(round(layer['x'] * factor)), int(round(layer['y'] * factor))
+    width = max(int(round(layer['width'] * factor)), 1)
+    height = max(int(round(layer['height'] * factor)), 1)
+
+    reference, alpha = load_watermark_reference(layer['image'], width, height)
+    if reference is None:
+        result['status'] = 'error'
+        return result
+
+    # 半透明图层按合成后的亮度比较（背景未知，用中灰近似）
+    opacity = layer.get('opacity', 1.0)
+    alpha = alpha * opacity
+    reference = reference * alpha + 128 * (1 - alpha)
+    mask = alpha > 0.5
+    if mask.sum() < 16:
+        result['status'] = 'skipped'
+        return result
+
+    scores = [match_score(frame, reference, mask, x, y) for frame in frames]
+    best_score, best_offset = max(scores, key=lambda item: item[0])
+    result['score'] = float(np.median([score for score, _ in scores]))
+    result['offset'] = best_offset
+    result['status'] = 'ok' if result['score'] >= layer.get('threshold', DEFAULT_THRESHOLD) else 'mismatch'
+    return result
+
+def verify_output(task, samples=DEFAULT_SAMPLES, threshold=DEFAULT_THRESHOLD):
+    """
+    校验一个输出文件中的所有图片图层
+    task 由 add_watermark_with_ffmpeg 生成: output / frame_width / frame_height / duration / layers
+    """
+    output_path = task['output']
+    frame_width = task['frame_width']
+    frame_height = task['frame_height']
+    results = []
+
+    try:
+        # 水印超出画面（位置调整后仍越界）不需要解码即可判定
+        layers_in_frame = []
+        for layer in task['layers']:
+            if (layer['x'] < 0 or layer['y'] < 0 or
+                    layer['x'] + layer['width'] > frame_width or
+                    layer['y'] + layer['height'] > frame_height):
+                results.append({
+                    'output': output_path, 'layer': os.path.basename(layer['image']),
+                    'status': 'offscreen', 'score': None, 'offset': None
+                })
+            else:
+                layers_in_frame.append(dict(layer, threshold=threshold))
+
+        if not layers_in_frame:
+            return results
+
+        factor = min(1.0, ANALYSIS_MAX_WIDTH / frame_width)
+        width = max(int(frame_width * factor) // 2 * 2, 2)
+        height = max(int(frame_height * factor) // 2 * 2, 2)
+        factor = width / frame_width
+
+        frames = sample_frames(output_path, width, height, samples, task.get('duration'))
+        if not frames:
+            for layer in layers_in_frame:
+                results.append({
+                    'output': output_path, 'layer': os.path.basename(layer['image']),
+                    'status': 'error', 'score': None, 'offset': None
+                })
+            return results
+
+        for layer in layers_in_frame:
+            results.append(verify_layer(output_path, frames, layer, factor))
+
+    except Exception as e:
+        print(f"❌ 校验 {os.path.basename(output_path)} 时出错: {str(e)}")
+        print(traceback.format_exc())
+        results.append({'output': output_path, 'layer': None, 'status': 'error', 'score': None, 'offset': None})
+
+    return results
+
+def submit_verifications(executor, tasks, futures, verify_config):
+    """把待校验任务提交到线程池（与下一个编码任务并行执行）"""
+    while tasks:
+        task = tasks.pop(0)
+        futures.append(executor.submit(
+            verify_output, task,
+            verify_config.get('samples', DEFAULT_SAMPLES),
+            verify_config.get('threshold', DEFAULT_THRESHOLD)
+        ))
+
+def report_verifications(futures):
+    """等待所有校验完成并打印汇总，返回可疑结果列表"""
+    status_names = {
+        'ok': '通过',
+        'mismatch': '未匹配',
+        'offscreen': '超出画面',
+        'skipped': '跳过',
+        'error': '出错'
+    }
+    flagged = []
+    passed = 0
+    for future in futures:
+        for result in future.result():
+            if result['status'] in ('ok', 'skipped'):
+                passed += 1
+            else:
+                flagged.append(result)
+
+    print(f"\n水印校验: 通过 {passed}, 可疑 {len(flagged)}")
+    for result in flagged:
+        score = f"{result['score']:.2f}" if result['score'] is not None else "-"
+        print(f"⚠️  {os.path.basename(result['output'])} [{result['layer']}]: "
+              f"{status_names.get(result['status'], result['status'])} (得分={score}, 偏移={result['offset']})")
+    return flagged